@@ -1,22 +1,85 @@
 import subprocess
 import os
 import shutil
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-import filecmp
-from typing import List, Optional
+from typing import Callable, Iterable, List, Optional, Tuple
 
-from caseloader import TestCase, Loader
+from caseloader import FailureManifest, TestCase, Loader, unique_names
+from matcher import RunResult, compare_files, run_and_match
+from timing import CaseTiming, TimingReport
+from runtime import build_runtime
+from results_db import ResultsStore
+from progress import Progress
+from limits import (
+    Limits, StageTimeout, run_stage,
+    TIME_LIMIT_EXCEEDED, MEMORY_LIMIT_EXCEEDED, RUNTIME_ERROR
+)
+from pipeline import (
+    ACCEPTED, COMPILATION_ERROR, WRONG_ANSWER, CaseContext, CaseResult, Pipeline,
+    Stage, StageFailed
+)
+
+
+# Abbreviations of the completion status in the statistical conclusion.
+STATUS_ABBRS = [
+    ('AC', ACCEPTED),
+    ('CE', COMPILATION_ERROR),
+    ('WA', WRONG_ANSWER),
+    ('TLE', TIME_LIMIT_EXCEEDED),
+    ('MLE', MEMORY_LIMIT_EXCEEDED),
+    ('RE', RUNTIME_ERROR),
+]
 
 
 class BackendAutoTester:
-    def __init__(self, gen_dir:str):
+    def __init__(self, 
+        gen_dir:str, keep_output:bool=False,
+        timing_baseline:Optional[str]=None, slowdown_threshold:float=0.1,
+        limits:Optional[Limits]=None, runtime:Optional[str]=None,
+        results_db:Optional[str]=None
+    ):
+        """Initialize a BackendAutoTester.
+
+        Args:
+            gen_dir: A string of path to the directory of the assembly transferred.
+            keep_output: Bool indicating if to write the output of the programs to 
+                    -gen.out files even when it is correct. By default, the output is
+                    matched as it comes and only written for Wrong Answers.
+            timing_baseline: [Optional] A string of path to the timing.json of a previous
+                    run. Testcases slowed down beyond slowdown_threshold (e.g. 0.1 for 10%)
+                    since then are flagged in stat.log.
+            slowdown_threshold: The relative slowdown beyond which a testcase is flagged.
+            limits: [Optional] The Limits on time (for linking and executing) and memory
+                    for each testcase. Unlimited by default.
+            runtime: [Optional] A string of path to the static archive of the SysY
+                    runtime to link with. By default, it is built from sylib.c once
+                    (see runtime.build_runtime), or libsysy.a if sylib.c is not found.
+            results_db: [Optional] A string of path to the SQLite database to store
+                    the results of each testcase into (see results_db.py). By default,
+                    results.db next to gen_dir.
+        """
         self.root_dir = Path(gen_dir)
+        self.runtime = Path(runtime) if runtime is not None else build_runtime()
+        self.keep_output = keep_output
+        self.timing_baseline = timing_baseline
+        self.slowdown_threshold = slowdown_threshold
+        self.limits = limits if limits is not None else Limits()
         self.compilerr_dir = self.root_dir/"ce-cases"
         self.wrongans_dir = self.root_dir/"wa-cases"
         self.log_path = self.root_dir/"result.log"
         self.stat_path = self.root_dir/"stat.log"
+        self.failures = FailureManifest(self.root_dir/"failures.jsonl")
         self.max_path_width = 45
+        # The native route: link -> exec -> match.
+        self.pipeline = Pipeline([
+            Stage('link', self.link_asm),
+            Stage('exec', self.exec_asm),
+            Stage('match', self.match_output),
+        ], on_failure=self.keep_failed)
         
         if self.wrongans_dir.exists():
             self.delete_dir(self.wrongans_dir)
@@ -24,6 +87,12 @@ class BackendAutoTester:
         if self.compilerr_dir.exists():
             self.delete_dir(self.compilerr_dir)
         os.makedirs(self.compilerr_dir)
+        # Indexes the directories above.
+        if self.failures.path.exists():
+            self.failures.path.unlink()
+        self.results_store = ResultsStore(
+            results_db if results_db is not None else self.root_dir.parent/'results.db'
+        )
 
     def delete_dir(self, path:Path):
         if path.exists():
@@ -36,87 +105,302 @@ class BackendAutoTester:
 
 
     def run(self, 
-        testcases: List[TestCase], echo_ret:bool=True, terminal_log=True) -> None:
+        testcases: Iterable[TestCase], echo_ret:bool=True, terminal_log=True,
+        on_result:Optional[Callable[[TestCase, CaseResult], None]]=None,
+        link_jobs:int=1, exec_jobs:int=1) -> None:
         """Run through all the testcases to generate results.
 
+        If link_jobs > 1, all the testcases are assembled and linked concurrently
+        (see link_all) before any is executed, so that executing is not disturbed
+        by linking.
+
         Args:
+            testcases: TestCases to run, e.g. a Loader.
             echo_ret: Bool indicating if to echo the process return codes to .out files.
+            on_result: [Optional] A function called with each testcase and its
+                    CaseResult as soon as it is tested.
+            link_jobs: Number of testcases to assemble and link concurrently.
+            exec_jobs: Number of testcases to execute concurrently. Keep it 1 for
+                    testcases measured for performance, or they would slow each other.
+
+        On the terminal, the testcases are printed as they finish, below which the
+        testcases in flight, the throughput and the counts so far are shown (see
+        progress.py).
         """
+        # Loaded all at once, as the testcases are linked up front and logged in order.
+        # Named uniquely, as the files generated are named after the testcases.
+        testcases = list(unique_names(testcases))
+        if not testcases:
+            print('No testcases to run.')
+            return
         # Adjust logging format.
-        new_width = max([len(str(tc.s_path)) for tc in testcases])
+        new_width = max((len(str(tc.src_path)) for tc in testcases), default=0)
         if new_width > self.max_path_width:
             self.max_path_width = new_width
         # Statistic Info
-        cnt_wrongans = 0
-        cnt_compilerr = 0
-        cnt_accept = 0
+        counts = Counter()
+        timing_report = TimingReport(self.timing_baseline, self.slowdown_threshold)
 
         # Run.
         with open(self.log_path, 'a+') as log_file, open(self.stat_path, 'a+') as stat_file:
-            # Loop through each test case.
-            for testcase in testcases:                
-                out_path = self.root_dir/testcase.gen_out_name
-                s_path = self.root_dir/testcase.s_path.name
+            # Link all the testcases up front.
+            if link_jobs > 1:
+                linked = self.link_all(testcases, link_jobs)
+            else:
+                linked = [None] * len(testcases)
 
-                if terminal_log:
-                    print(str(testcase.s_path).ljust(self.max_path_width, ' ') + f' \tRunning', 
-                    end='\r')
-
-                o_path = self.gen_out(testcase)
-                if o_path is None:
-                    status = 'Compilation Error'
-                    cnt_compilerr += 1
-                    # Copy the error-compiled testcase to the CE-directory.
-                    p = testcase.copy_to(self.compilerr_dir)
-                else:
-                    self.run_asm(o_path, out_path, testcase.in_path)
-                    if self.match(out_path, testcase.std_out_path):
-                        status = 'Accecpted'
-                        cnt_accept += 1
-                    else:
-                        status = 'Wrong Answer'
-                        cnt_wrongans += 1
-                        # Copy the wrongly answered testcase to the WA-directory.
-                        p = testcase.copy_to(self.wrongans_dir)
-                        shutil.copyfile(out_path, p/testcase.gen_out_name)
-                
-                log = (
-                    str(testcase.s_path).ljust(self.max_path_width, ' ')
-                    + f' \t{status}\n'
+            progress = Progress(
+                len(testcases), STATUS_ABBRS, self.max_path_width,
+                live=None if terminal_log else False
+            )
+
+            def run_one(case):
+                testcase, link = case
+                progress.start(testcase)
+                result = self.run_case(testcase, echo_ret, False, link, progress)
+                progress.finish(
+                    testcase, result.status,
+                    self.log_line(testcase, result.status, result.note)
+                    if terminal_log else ''
                 )
-                log_file.write(log)
-                if terminal_log:
-                    print(log, end='')
+                return result
+
+            executor = ThreadPoolExecutor(max_workers=exec_jobs) if exec_jobs > 1 else None
+            # Results come in the order of the testcases, even if executed concurrently.
+            results = executor.map(run_one, zip(testcases, linked)) if executor is not None \
+                else map(run_one, zip(testcases, linked))
+            # Loop through each test case.
+            run_id = self.results_store.begin_run('arm', str(self.root_dir))
+            for testcase, result in zip(testcases, results):
+                status, note, timing = result.status, result.note, result.timing
+                # Named by the testcase only, as the directory differs in each run.
+                self.results_store.add(
+                    run_id, testcase.name, status, note, result.stages,
+                    result.returncode, result.output_size,
+                    timing.max_rss if timing is not None else None
+                )
+                counts[status] += 1
+                if timing is not None:
+                    timing_report.add(timing)
+                log_file.write(self.log_line(testcase, status, note))
+                if on_result is not None:
+                    on_result(testcase, result)
+            if executor is not None:
+                executor.shutdown()
+            progress.close()
             # Statistical conclusion.
-            stat_conclu = (
-                f'AC: {cnt_accept:>3}/{len(testcases)}, '
-                f'CE: {cnt_compilerr:>3}/{len(testcases)}, '
-                f'WA: {cnt_wrongans:>3}/{len(testcases)}\n'
-            )
+            stat_conclu = ', '.join(
+                f'{abbr}: {counts[status]:>3}/{len(testcases)}'
+                for abbr, status in STATUS_ABBRS
+            ) + '\n'
             stat_file.write(stat_conclu)
+            self.results_store.end_run(run_id, stat_conclu)
             if terminal_log:
                 print(stat_conclu, end='')
+            # Timing table and regressions since the baseline.
+            timing_report.write(self.root_dir)
+            if self.timing_baseline is not None:
+                stat_file.write(timing_report.stat_line())
+                if terminal_log:
+                    print(timing_report.stat_line(), end='')
+
+    def log_line(self, testcase:TestCase, status:str, note:str='') -> str:
+        """Format the line of the result of a testcase in result.log.
+        """
+        return (
+            str(testcase.src_path).ljust(self.max_path_width, ' ')
+            + f' \t{status}'
+            + (f' ({note})\n' if note else '\n')
+        )
+
+    def link_case(self, testcase:TestCase) -> Tuple[Optional[str], str]:
+        """Assemble and link a single testcase.
+
+        Returns:
+            A string of the path to the executable (None if failed), and a string of
+            note on the failure which is empty unless linking timed out.
+        """
+        try:
+            return self.gen_out(testcase), ''
+        except StageTimeout as e:
+            return None, e.note
+
+    def run_case(self, 
+        testcase:TestCase, echo_ret:bool=True, terminal_log=True,
+        linked:Optional[Tuple[Optional[str], str]]=None,
+        progress:Optional[Progress]=None
+    ) -> CaseResult:
+        """Assemble, link, execute and match a single testcase through the pipeline.
+
+        Args:
+            testcase: A TestCase to be tested.
+            echo_ret: Bool indicating if to echo the process return codes to .out files.
+            terminal_log: Bool indicating if to print a running hint to the terminal.
+            linked: [Optional] The result of link_case() if the testcase is linked
+                    already.
+            progress: [Optional] The Progress of the run, to show the stage the
+                    testcase is in.
+
+        Returns:
+            The CaseResult of the testcase.
+        """
+        if terminal_log:
+            print(str(testcase.src_path).ljust(self.max_path_width, ' ') + f' \tRunning', 
+            end='\r')
+        return self.pipeline.run(
+            testcase, on_stage=progress.stage if progress is not None else None,
+            echo_ret=echo_ret, linked=linked
+        )
+
+    def keep_failed(self, ctx:CaseContext, result:CaseResult) -> None:
+        """Collect a failed testcase (with the output if any) to the CE- or WA-directory,
+        and record it in failures.jsonl.
+        """
+        if ctx.failed_stage == 'link':
+            p, files = ctx.testcase.collect(self.compilerr_dir)
+        else:
+            p, files = ctx.testcase.collect(
+                self.wrongans_dir, [self.root_dir/ctx.testcase.gen_out_name]
+            )
+        self.failures.add(
+            ctx.testcase, result.status, result.note, ctx.failed_stage, p, files
+        )
+
+    def link_asm(self, ctx:CaseContext) -> Optional[bool]:
+        """The link stage: assemble and link the testcase, unless linked already.
+
+        Raises:
+            StageFailed: If assembling or linking fails, or runs out of its time limit.
+        """
+        linked = ctx.options.get('linked')
+        if linked is None:
+            o_path = self.gen_out(ctx.testcase)
+            if o_path is None:
+                raise StageFailed(COMPILATION_ERROR)
+            ctx.artifacts['exe'] = o_path
+            return None
+        o_path, note = linked
+        if o_path is None:
+            raise StageFailed(TIME_LIMIT_EXCEEDED if note else COMPILATION_ERROR, note)
+        ctx.artifacts['exe'] = o_path
+        return False
+
+    def exec_asm(self, ctx:CaseContext) -> None:
+        """The exec stage: run the executable, matching the output as it comes.
+
+        Raises:
+            StageFailed: If the program fails to even start.
+        """
+        testcase = ctx.testcase
+        out_path = self.root_dir/testcase.gen_out_name
+        ctx.artifacts['out'] = out_path
+        try:
+            ctx.run = self.run_asm(
+                ctx.artifacts['exe'], out_path, testcase.in_path, ctx.options['echo_ret'],
+                std_out_path=testcase.std_out_path
+            )
+        except OSError as e:
+            raise self.limits.start_failure(e)
+        ctx.stages['exec'] = ctx.run.wall_time
+        # Named by the testcase only, as the directory differs in each run.
+        ctx.timing = CaseTiming(
+            testcase.name, ctx.run.wall_time, ctx.run.max_rss, ctx.run.stderr
+        )
+
+    def match_output(self, ctx:CaseContext) -> None:
+        """The match stage: judge the execution by the limits and the standard output.
+
+        Raises:
+            StageFailed: If the program ended abnormally or answered wrong.
+        """
+        self.limits.check(ctx.run)
 
     
+    def link_all(self, testcases:List[TestCase], jobs:int) -> List[Tuple[Optional[str], str]]:
+        """Assemble and link testcases concurrently.
+
+        The steps of all the testcases are written into a Makefile under the root
+        directory, which is made at once with `make -j`. If make is not available,
+        link_case() is called for the testcases concurrently instead.
+
+        Returns:
+            A list of the results of link_case() for each of the testcases.
+        """
+        if shutil.which('make') is None:
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                return list(executor.map(self.link_case, testcases))
+
+        timeout = self.limits.link_timeout
+        # `timeout` exits with 124 if the command times out.
+        limit = f'timeout {timeout:g} ' if timeout is not None else ''
+        targets = []
+        rules = []
+        for testcase in testcases:
+            out_path = self.root_dir/testcase.exe_name
+            obj_path = self.root_dir/f'{testcase.name}.o'
+            fail_path = self.root_dir/f'{testcase.name}.fail'
+            for path in (fail_path, obj_path, out_path):
+                if path.exists():
+                    path.unlink()
+            targets.append(str(out_path))
+            rules.append(
+                f'{out_path}: {testcase.src_path}\n'
+                f'\t{limit}as {testcase.src_path} -o {obj_path}'
+                f' && {limit}gcc {obj_path} {self.runtime} -o {out_path}'
+                f' || echo $$? > {fail_path}\n'
+            )
+        makefile = self.root_dir/'Makefile'
+        with open(makefile, 'w') as f:
+            f.write(f'all: {" ".join(targets)}\n\n' + '\n'.join(rules))
+        subprocess.run(
+            f'make -B -s -j {jobs} -f {makefile}'.split(),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+
+        linked = []
+        for testcase in testcases:
+            out_path = self.root_dir/testcase.exe_name
+            fail_path = self.root_dir/f'{testcase.name}.fail'
+            if fail_path.exists():
+                timed_out = timeout is not None and fail_path.read_text().strip() == '124'
+                linked.append((None, str(StageTimeout('link', timeout)) if timed_out else ''))
+            elif out_path.exists():
+                linked.append((out_path, ''))
+            else:
+                linked.append((None, ''))
+        return linked
+
     def gen_out(self, testcase:TestCase) -> str:
-        # Compile the .sy file with our compiler.
-        out_path = self.root_dir / testcase.name
-        cmd_compile = (
+        """Assemble and link a testcase with the SysY runtime.
+
+        Raises:
+            StageTimeout: If as or gcc runs out of the time limit for linking.
+        """
+        out_path = self.root_dir / testcase.exe_name
+        obj_path = self.root_dir / f'{testcase.name}.o'
+        # Left by a previous run in the same directory, which would pass for the
+        # output of a failed assembling or linking.
+        for path in (obj_path, out_path):
+            if path.exists():
+                path.unlink()
+        # Assemble directly, saving the gcc driver.
+        cmd_assemble = f"as {testcase.src_path} -o {obj_path}"
+        run_stage(cmd_assemble.split(), 'assemble', self.limits.link_timeout)
+        if not os.path.exists(obj_path):
+            return None
+        # Link with the SysY runtime.
+        cmd_link = (
             f"gcc"
-            f" {testcase.s_path}"
+            f" {obj_path}"
+            f" {self.runtime}"
             f" -o {out_path}"
-            f" -L ."
-            f" -lsysy"
             # f" -march=armv7"
             # f" -mcpu=cortex-a7"
             # f" -mfloat-abi=hard"
         )
-        subprocess.run(
-            cmd_compile.split(),
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL
-        )
-        # If the compiler didn't successfully generate an .ll file.
+        run_stage(cmd_link.split(), 'link', self.limits.link_timeout)
+        # If the linker didn't successfully generate an executable.
         if not os.path.exists(out_path):
             return None
 
@@ -124,41 +408,30 @@ class BackendAutoTester:
 
 
     def run_asm(self, 
-        o_path:str, out_path:str, in_path:Optional[str]=None, echo_ret:bool=True
-    ) -> None:
-        cmd_run = f'./{o_path}'
-        with open(out_path, 'w+', encoding="utf-8") as out_file:
-            # Has input
-            if in_path is None: 
-                p = subprocess.run(
-                    cmd_run.split(), 
-                    stdout=out_file,
-                    stderr=subprocess.DEVNULL,
-                    encoding="utf-8"
-                )
-            # No input
-            else:               
-                with open(in_path, 'r') as in_file:
-                    p = subprocess.run(
-                        cmd_run.split(), 
-                        stdin=in_file, 
-                        stdout=out_file,
-                        stderr=subprocess.DEVNULL,
-                        encoding="utf-8"
-                    )
-
-            # Echo the return value to the output if required.
-            if echo_ret:
-                # If the execution generates any output, and the last character
-                # is not a newline ('\n'), then
-                # echo to switch to a new line for the return value.
-                if os.path.getsize(out_path) > 0:
-                    with open(out_path, 'r', encoding="utf-8") as f:
-                        last_ch = f.read()[-1]
-                    if last_ch != '\n':
-                        subprocess.run('echo', stdout=out_file)
-                subprocess.run(f'echo {p.returncode}'.split(), stdout=out_file)
-            
+        o_path:str, out_path:str, in_path:Optional[str]=None, echo_ret:bool=True,
+        std_out_path:Optional[str]=None
+    ) -> RunResult:
+        """Run an executable linked from the assembly.
+
+        Args:
+            o_path: A string of the path to the executable.
+            out_path: A string of the path to the file for stdout (output).
+            in_path: [Optional] A string of the path to the file for stdin (intput).
+            echo_ret: Bool indicating if to echo the process return codes to .out files.
+            std_out_path: [Optional] A string of the path to the standard output to 
+                    match the output against as it comes. If given, the output is
+                    written to out_path only when it is wrong (or keep_output is set).
+
+        Returns:
+            The RunResult of the execution, including the Mismatch of the output against
+            the standard one, and the timing and resource usage.
+        """
+        # Absolute, as the directory of the run may be either.
+        cmd_run = [str(Path(o_path).resolve())]
+        return run_and_match(
+            cmd_run, out_path, std_out_path, in_path, echo_ret, self.keep_output,
+            self.limits.exec_timeout, self.limits.rlimits()
+        )
 
     def match(self, file1:str, file2:str) -> bool:
-        return filecmp.cmp(file1, file2, shallow=False)
+        return compare_files(file1, file2) is None
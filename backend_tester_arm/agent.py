@@ -0,0 +1,246 @@
+import argparse
+import hmac
+import json
+import os
+import queue
+import shutil
+import socket
+import threading
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional
+
+from BackendTest import BackendAutoTester
+from pipeline import CaseResult
+from caseloader import TestCase, IN, STD_OUT
+from limits import Limits
+from runtime import build_runtime
+
+
+# The wire format (shared with backend_tester_x86/agent_client.py):
+# Each message is a line of JSON, followed by the raw bytes of the files listed
+# in its "files" (if any), one after another.
+#
+# A connection starts with the shared token, and is closed unless it matches:
+#   x86 -> ARM: {"type": "hello", "token": "..."}
+#   ARM -> x86: {"type": "welcome"} or {"type": "error", "message": "invalid token"}
+#
+# Then:
+#   x86 -> ARM: {"type": "batch", "id": 0, "echo": true, "cases": ["c1", ...],
+#                "files": [{"path": "c1.s", "size": 123}, {"path": "in/c1.in", ...}, ...]}
+#               {"type": "end"}
+#   ARM -> x86: {"type": "result", "batch": 0, "case": "c1", "status": "...", "note": "...",
+#                "stages": {"link": 0.1, "exec": 1.2}, "returncode": 0, "output_size": 12}
+#               {"type": "error", "batch": 0, "message": "..."} (if the batch fails to be tested)
+#               {"type": "done", "batch": 0, "stat": "AC: ..."}
+#               {"type": "bye"}
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 7070
+# The environment variable of the shared token, if not given on the command line.
+TOKEN_ENV = 'CBIAS_AGENT_TOKEN'
+CHUNK_SIZE = 1 << 16
+
+
+def send_message(wfile:BinaryIO, message:Dict, lock:Optional[threading.Lock]=None) -> None:
+    data = (json.dumps(message) + '\n').encode()
+    if lock is None:
+        wfile.write(data)
+        wfile.flush()
+        return
+    with lock:
+        wfile.write(data)
+        wfile.flush()
+
+
+def receive_file(rfile:BinaryIO, dest:Path, size:int) -> None:
+    with open(dest, 'wb') as f:
+        while size > 0:
+            chunk = rfile.read(min(size, CHUNK_SIZE))
+            if not chunk:
+                raise ConnectionError('connection closed in the middle of a file')
+            f.write(chunk)
+            size -= len(chunk)
+
+
+class Agent:
+    """Agent tests batches of assembly sent over a connection, so that the x86 side
+    doesn't have to upload files and wait for someone to run pi_run.py.
+
+    Batches are received while the previous ones are being tested, and each is tested
+    with a BackendAutoTester in its own directory under work_dir. Results are sent back
+    case by case as soon as they come out.
+
+    Note the agent should be started in this directory, where the SysY runtime
+    (sylib.c, or libsysy.a) to link with is.
+
+    As the agent runs whatever it is sent, a connection has to present the shared
+    token before any batch is accepted, and the agent listens on the loopback only
+    unless told otherwise (e.g. reached through an SSH tunnel).
+
+    Attributes:
+        token: A string of the token shared with the x86 side.
+        work_dir: A Path to the directory to receive batches into.
+        keep_output: Bool indicating if to keep the output of all testcases.
+        limits: The Limits on each testcase.
+        link_jobs: Number of testcases in a batch to assemble and link concurrently.
+        exec_jobs: Number of testcases in a batch to execute concurrently.
+    """
+
+    def __init__(self,
+        token:str, work_dir:str='agent-work', keep_output:bool=False,
+        limits:Optional[Limits]=None, link_jobs:int=1, exec_jobs:int=1
+    ) -> None:
+        if not token:
+            raise ValueError('a shared token is required')
+        self.token = token
+        self.work_dir = Path(work_dir)
+        self.keep_output = keep_output
+        self.limits = limits
+        self.link_jobs = link_jobs
+        self.exec_jobs = exec_jobs
+        # Built once for all the batches.
+        self.runtime = build_runtime()
+        self.n_connections = 0
+
+    def serve(self, host:str=DEFAULT_HOST, port:int=DEFAULT_PORT) -> None:
+        """Serve connections one after another, forever.
+        """
+        with socket.create_server((host, port)) as server:
+            print(f'Agent listening on {host}:{port}')
+            while True:
+                conn, addr = server.accept()
+                print(f'Connected by {addr[0]}:{addr[1]}')
+                try:
+                    self.handle(conn)
+                except (OSError, ValueError) as e:
+                    print(f'Connection from {addr[0]}:{addr[1]} failed: {e}')
+                finally:
+                    conn.close()
+
+    def handle(self, conn:socket.socket) -> None:
+        """Receive batches from a connection, and test them one by one in the background.
+        """
+        with conn.makefile('rb') as rfile, conn.makefile('wb') as wfile:
+            if not self.authenticate(rfile, wfile):
+                print('Connection closed for an invalid token.')
+                return
+            self.n_connections += 1
+            conn_dir = self.work_dir/f'conn-{self.n_connections}'
+            batches = queue.Queue()
+            lock = threading.Lock()
+
+            def test_batches():
+                for batch_dir, header in iter(batches.get, None):
+                    try:
+                        self.run_batch(batch_dir, header, wfile, lock)
+                    except Exception as e:
+                        # Reported rather than lost with the thread, and the
+                        # batch is done anyway.
+                        print(f"Batch {header['id']} failed: {e!r}")
+                        try:
+                            send_message(wfile, {
+                                'type': 'error', 'batch': header['id'], 'message': repr(e)
+                            }, lock)
+                            send_message(wfile, {
+                                'type': 'done', 'batch': header['id'], 'stat': ''
+                            }, lock)
+                        except OSError:
+                            pass
+
+            runner = threading.Thread(target=test_batches)
+            runner.start()
+            try:
+                for line in rfile:
+                    header = json.loads(line)
+                    if header['type'] == 'end':
+                        break
+                    batch_dir = conn_dir/f"batch-{header['id']}"
+                    self.receive_batch(rfile, batch_dir, header)
+                    batches.put((batch_dir, header))
+            finally:
+                batches.put(None)
+                runner.join()
+            send_message(wfile, {'type': 'bye'}, lock)
+
+    def authenticate(self, rfile:BinaryIO, wfile:BinaryIO) -> bool:
+        """Check the token the connection starts with, replying whether it matches.
+        """
+        try:
+            hello = json.loads(rfile.readline())
+        except ValueError:
+            hello = None
+        token = hello.get('token') if isinstance(hello, dict) and hello.get('type') == 'hello' \
+            else None
+        if not isinstance(token, str) \
+            or not hmac.compare_digest(token.encode(), self.token.encode()):
+            send_message(wfile, {'type': 'error', 'message': 'invalid token'})
+            return False
+        send_message(wfile, {'type': 'welcome'})
+        return True
+
+    def receive_batch(self, rfile:BinaryIO, batch_dir:Path, header:Dict) -> None:
+        # Left by a previous agent process, of which the logs would be appended to.
+        shutil.rmtree(batch_dir, ignore_errors=True)
+        os.makedirs(batch_dir/IN, exist_ok=True)
+        os.makedirs(batch_dir/STD_OUT, exist_ok=True)
+        for f in header['files']:
+            path = Path(f['path'])
+            if path.is_absolute() or '..' in path.parts:
+                raise ValueError(f"invalid path in batch: {f['path']}")
+            receive_file(rfile, batch_dir/path, f['size'])
+
+    def run_batch(self, batch_dir:Path, header:Dict, wfile:BinaryIO, lock:threading.Lock) -> None:
+        testcases = []
+        for name in header['cases']:
+            in_path = batch_dir/IN/f'{name}.in'
+            testcases.append(TestCase(
+                batch_dir/f'{name}.s', batch_dir/STD_OUT/f'{name}.out',
+                in_path if in_path.exists() else None
+            ))
+        tester = BackendAutoTester(
+            batch_dir, self.keep_output, limits=self.limits, runtime=str(self.runtime),
+            results_db=str(self.work_dir/'results.db')
+        )
+
+        def report(testcase:TestCase, result:CaseResult) -> None:
+            send_message(wfile, {
+                'type': 'result', 'batch': header['id'], 'case': testcase.name,
+                'status': result.status, 'note': result.note, 'stages': result.stages,
+                'returncode': result.returncode, 'output_size': result.output_size
+            }, lock)
+
+        try:
+            if testcases:
+                tester.run(
+                    testcases, header.get('echo', True), terminal_log=False, on_result=report,
+                    link_jobs=self.link_jobs, exec_jobs=self.exec_jobs
+                )
+        finally:
+            tester.results_store.close()
+        stat = tester.stat_path.read_text() if tester.stat_path.exists() else ''
+        send_message(wfile, {'type': 'done', 'batch': header['id'], 'stat': stat}, lock)
+        print(f"Batch {header['id']}: {stat}", end='' if stat.endswith('\n') else '\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Test batches of assembly sent from x86.')
+    parser.add_argument('--host', default=DEFAULT_HOST,
+        help='address to listen on, e.g. 0.0.0.0 to accept connections from the network')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--token', default=os.environ.get(TOKEN_ENV),
+        help=f'token shared with the x86 side, {TOKEN_ENV} by default')
+    parser.add_argument('--work-dir', default='agent-work')
+    parser.add_argument('--exec-timeout', type=float, default=None)
+    parser.add_argument('--link-jobs', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--exec-jobs', type=int, default=1)
+    args = parser.parse_args()
+    if not args.token:
+        parser.error(f'a shared token is required, by --token or {TOKEN_ENV}')
+
+    agent = Agent(
+        args.token, args.work_dir, limits=Limits(exec_timeout=args.exec_timeout),
+        link_jobs=args.link_jobs, exec_jobs=args.exec_jobs
+    )
+    agent.serve(args.host, args.port)
+
+# CBIAS_AGENT_TOKEN=... python3 agent.py --port 7070
@@ -0,0 +1,325 @@
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, List, NamedTuple, Optional
+
+
+# White spaces ignored at the end of lines (as `diff -Z` does).
+_TRAILING_SPACES = re.compile(rb'[ \t\r\f\v]+\n')
+_PENDING_SPACES = re.compile(rb'[ \t\r\f\v]+$')
+
+CHUNK_SIZE = 1 << 16
+# Output of a program is held in memory up to this size before spilling to disk.
+SPOOL_SIZE = 1 << 22
+# Only the tail of stderr (where the SysY runtime reports timers) is kept.
+STDERR_TAIL = 1 << 16
+# Whether a program can be waited for without reaping it, and then reaped with its
+# resource usage. Not on Windows (nor waitid on macOS).
+CAN_WAIT4 = hasattr(os, 'waitid') and hasattr(os, 'wait4')
+
+
+class Mismatch(NamedTuple):
+    """Position of the first difference between two outputs.
+
+    Attributes:
+        line: The 1-based number of the line where the outputs differ.
+        column: The 1-based byte offset in the line where the outputs differ.
+    """
+    line: int
+    column: int
+
+    def __str__(self) -> str:
+        return f'line {self.line}, column {self.column}'
+
+
+class Normalizer:
+    """Normalizer strips the white spaces at the end of each line of a stream.
+
+    The stream is fed chunk by chunk. White spaces at the end of a chunk are held
+    back until it turns out whether they end a line. A last line without a newline
+    is terminated with one, so that the result is the same as `diff -Z` sees it.
+    """
+
+    def __init__(self) -> None:
+        self._pending = b''
+        self._line_open = False
+
+    def feed(self, chunk:bytes) -> bytes:
+        """Normalize the next chunk of the stream.
+        """
+        if not chunk:
+            return b''
+        data = _TRAILING_SPACES.sub(b'\n', self._pending + chunk)
+        m = _PENDING_SPACES.search(data)
+        if m is None:
+            self._pending = b''
+        else:
+            self._pending = data[m.start():]
+            data = data[:m.start()]
+        self._line_open = not chunk.endswith(b'\n')
+        return data
+
+    def finish(self) -> bytes:
+        """Get the rest of the normalized stream after the last chunk.
+        """
+        self._pending = b''
+        return b'\n' if self._line_open else b''
+
+
+class StreamComparator:
+    """StreamComparator matches a stream against an expected one as they come.
+
+    Both streams are normalized (see Normalizer), so differences in white spaces at
+    the end of lines are ignored. Data of a stream is kept only until the other
+    stream catches up, so comparing needs no more memory than their skew.
+
+    Attributes:
+        mismatch: The Mismatch found so far, or None if the streams agree so far.
+    """
+
+    def __init__(self) -> None:
+        self.mismatch = None
+        self._normalizers = (Normalizer(), Normalizer())
+        self._buffers = [b'', b'']
+        # Position of the start of the buffers in the normalized streams.
+        self._line = 1
+        self._line_start = 0
+        self._offset = 0
+
+    def feed(self, side:int, chunk:bytes) -> None:
+        """Feed the next chunk of one of the streams (0 for actual, 1 for expected).
+        """
+        if self.mismatch is None:
+            self._buffers[side] += self._normalizers[side].feed(chunk)
+            self._advance()
+
+    def finish(self) -> Optional[Mismatch]:
+        """Conclude the comparison after both the streams end.
+
+        Returns:
+            The Mismatch of the two streams, or None if they are identical.
+        """
+        if self.mismatch is None:
+            for side in (0, 1):
+                self._buffers[side] += self._normalizers[side].finish()
+            self._advance()
+        if self.mismatch is None and any(self._buffers):
+            # One of the streams is a prefix of the other.
+            self._fail(0)
+        return self.mismatch
+
+    def _advance(self) -> None:
+        """Compare the part of the streams both have arrived.
+        """
+        a, b = self._buffers
+        n = min(len(a), len(b))
+        if n == 0:
+            return
+        if a[:n] != b[:n]:
+            i = next(i for i in range(n) if a[i] != b[i])
+            self._fail(i)
+            return
+        self._consume(a[:n])
+        self._buffers = [a[n:], b[n:]]
+
+    def _consume(self, data:bytes) -> None:
+        newlines = data.count(b'\n')
+        if newlines:
+            self._line += newlines
+            self._line_start = self._offset + data.rindex(b'\n') + 1
+        self._offset += len(data)
+
+    def _fail(self, index:int) -> None:
+        self._consume(self._buffers[0][:index])
+        self.mismatch = Mismatch(self._line, self._offset - self._line_start + 1)
+        self._buffers = [b'', b'']
+
+
+def compare_files(
+    actual_path:str, expected_path:str, chunk_size:int=CHUNK_SIZE
+) -> Optional[Mismatch]:
+    """Compare two text files, ignoring white spaces at the end of lines.
+
+    Args:
+        actual_path: A string of the path to the output to be checked.
+        expected_path: A string of the path to the expected output.
+        chunk_size: Number of bytes read from the files at a time.
+
+    Returns:
+        The Mismatch of the two files, or None if they are identical.
+    """
+    comparator = StreamComparator()
+    with open(actual_path, 'rb') as actual, open(expected_path, 'rb') as expected:
+        while comparator.mismatch is None:
+            chunk_actual = actual.read(chunk_size)
+            chunk_expected = expected.read(chunk_size)
+            if not chunk_actual and not chunk_expected:
+                break
+            comparator.feed(0, chunk_actual)
+            comparator.feed(1, chunk_expected)
+    return comparator.finish()
+
+
+class RunResult(NamedTuple):
+    """Result of running a program.
+
+    Attributes:
+        returncode: The return code of the program (negative if killed by a signal).
+        mismatch: The Mismatch of the output against the standard one, or None if
+                the output is correct (or not matched).
+        wall_time: Wall-clock seconds of the execution.
+        max_rss: Peak resident set size of the program in KiB, or None if unknown
+                (see CAN_WAIT4).
+        stderr: A string of the tail of stderr of the program.
+        timed_out: Bool indicating if the program was killed for running out of time.
+        output_size: Size of the output of the program in bytes (w/o the return code).
+    """
+    returncode: int
+    mismatch: Optional[Mismatch]
+    wall_time: float
+    max_rss: Optional[int]
+    stderr: str
+    timed_out: bool
+    output_size: int
+
+
+def _exit_code(status:int) -> int:
+    """Convert a wait status into a return code as Popen.returncode does.
+    """
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def run_and_match(
+    cmd:List[str], out_path:str, std_out_path:Optional[str]=None,
+    in_path:Optional[str]=None, echo_ret:bool=True, keep_output:bool=False,
+    timeout:Optional[float]=None, on_start:Optional[Callable[[int], None]]=None
+) -> RunResult:
+    """Run a program and match its output against the standard one as it comes.
+
+    The stdout of the program is streamed through a pipe into a StreamComparator,
+    so the output is never re-read from disk. It is also spooled (in memory up to
+    SPOOL_SIZE, beyond which spilled to an anonymous temporary file) to be written
+    to out_path, which happens only if the output turns out wrong or keep_output
+    is set. The stderr of the program is captured, and the program is reaped with
+    wait4() to get its resource usage where available (see CAN_WAIT4). If the
+    program runs out of the timeout, it is killed and whatever output so far is
+    matched.
+
+    Args:
+        cmd: A list of strings of the command to run the program.
+        out_path: A string of the path to the file for the output.
+        std_out_path: [Optional] A string of the path to the standard output. If not
+                given, the output is not matched and always written to out_path.
+        in_path: [Optional] A string of the path to the file for stdin (input).
+        echo_ret: Bool indicating if to echo the process return code to the output.
+        keep_output: Bool indicating if to write the output even if it is correct.
+        timeout: [Optional] Wall-clock seconds allowed for the program.
+        on_start: [Optional] A function called with the pid of the program as soon
+                as it starts, e.g. for applying rlimits (see Limits.rlimits).
+
+    Returns:
+        A RunResult of the program.
+    """
+    comparator = StreamComparator()
+    expected = open(std_out_path, 'rb') if std_out_path is not None else None
+    in_file = open(in_path, 'rb') if in_path is not None else None
+    spool = tempfile.SpooledTemporaryFile(SPOOL_SIZE, dir=Path(out_path).parent)
+    # Stderr goes to a file rather than a second pipe, which would
+    # deadlock once filled up while stdout is being drained.
+    err_file = tempfile.TemporaryFile(dir=Path(out_path).parent)
+    try:
+        start = time.perf_counter()
+        proc = subprocess.Popen(
+            cmd,
+            stdin=in_file,
+            stdout=subprocess.PIPE,
+            stderr=err_file
+        )
+        if on_start is not None:
+            on_start(proc.pid)
+        # Kill the program on timeout unless it has already ended.
+        # The lock keeps the kill from hitting a reaped (and maybe reused) pid.
+        lock = threading.Lock()
+        state = {'reaped': False, 'timed_out': False}
+        def kill_on_timeout():
+            with lock:
+                if not state['reaped']:
+                    state['timed_out'] = True
+                    proc.kill()
+        timer = threading.Timer(timeout, kill_on_timeout) if timeout is not None else None
+        if timer is not None:
+            timer.start()
+        last_byte = b''
+        output_size = 0
+        with proc.stdout:
+            for chunk in iter(lambda: proc.stdout.read1(CHUNK_SIZE), b''):
+                spool.write(chunk)
+                output_size += len(chunk)
+                last_byte = chunk[-1:]
+                # Stop comparing once the output goes wrong, but keep draining
+                # the pipe to record the whole output.
+                if expected is not None and comparator.mismatch is None:
+                    comparator.feed(0, chunk)
+                    comparator.feed(1, expected.read(len(chunk)))
+        if CAN_WAIT4:
+            # Wait for the program to end without reaping it first.
+            os.waitid(os.P_PID, proc.pid, os.WEXITED | os.WNOWAIT)
+        else:
+            # Reaped by Popen, after which it never kills the pid.
+            proc.wait()
+        with lock:
+            state['reaped'] = True
+        if timer is not None:
+            timer.cancel()
+        if CAN_WAIT4:
+            _, status, rusage = os.wait4(proc.pid, 0)
+            returncode = proc.returncode = _exit_code(status)
+            max_rss = rusage.ru_maxrss
+        else:
+            returncode, max_rss = proc.returncode, None
+        wall_time = time.perf_counter() - start
+        err_file.seek(max(0, err_file.seek(0, os.SEEK_END) - STDERR_TAIL))
+        stderr = err_file.read().decode(errors='replace')
+
+        # Echo the return value to the output if required.
+        if echo_ret:
+            # If the execution generates any output, and the last character
+            # is not a newline ('\n'), then
+            # switch to a new line for the return value.
+            trailer = (b'\n' if last_byte not in (b'', b'\n') else b'') \
+                + f'{returncode}\n'.encode()
+            spool.write(trailer)
+            if expected is not None:
+                comparator.feed(0, trailer)
+
+        mismatch = None
+        if expected is not None:
+            # Feed the rest of the standard output, if any.
+            for chunk in iter(lambda: expected.read(CHUNK_SIZE), b''):
+                if comparator.mismatch is not None:
+                    break
+                comparator.feed(1, chunk)
+            mismatch = comparator.finish()
+
+        if expected is None or mismatch is not None or keep_output:
+            spool.seek(0)
+            with open(out_path, 'wb') as out_file:
+                shutil.copyfileobj(spool, out_file)
+        return RunResult(
+            returncode, mismatch, wall_time, max_rss, stderr, state['timed_out'],
+            output_size
+        )
+    finally:
+        spool.close()
+        err_file.close()
+        if in_file is not None:
+            in_file.close()
+        if expected is not None:
+            expected.close()
@@ -1,12 +1,12 @@
 from BackendTest import BackendAutoTester
-from caseloader import Loader
+from caseloader import Loader, IN, STD_OUT
 
 if __name__ == '__main__':
     path = 'testgen-0821-110303'
 
     tester = BackendAutoTester(path)
-    loader = Loader(path)
+    loader = Loader(path, suffix='.s', io_dirs=(IN, STD_OUT))
 
-    tester.run(loader.testcases)
+    tester.run(loader)
 
 # python3 pi_run.py
\ No newline at end of file
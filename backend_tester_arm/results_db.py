@@ -0,0 +1,212 @@
+import argparse
+import sqlite3
+import time
+from typing import Dict, List, Optional, Tuple
+
+from pipeline import ACCEPTED
+
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    tester TEXT NOT NULL,
+    root_dir TEXT,
+    compiler_hash TEXT,
+    started REAL NOT NULL,
+    finished REAL,
+    stat TEXT
+);
+CREATE TABLE IF NOT EXISTS cases (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    path TEXT NOT NULL,
+    status TEXT NOT NULL,
+    note TEXT,
+    compile_s REAL,
+    link_s REAL,
+    exec_s REAL,
+    returncode INTEGER,
+    output_size INTEGER,
+    max_rss INTEGER
+);
+CREATE INDEX IF NOT EXISTS cases_by_path ON cases(path, run_id);
+CREATE INDEX IF NOT EXISTS cases_by_run ON cases(run_id, exec_s);
+'''
+
+class ResultsStore:
+    """ResultsStore keeps the per-case results of all runs of the testers in an
+    SQLite database, indexed for querying across thousands of runs.
+
+    A run is begun with begin_run(), gets a record added for each testcase with
+    add(), and is ended with end_run(). Records are committed as they are added,
+    so the results of an interrupted run are kept as far as it got.
+
+    Attributes:
+        path: A string of path to the database file.
+    """
+
+    def __init__(self, path:str) -> None:
+        self.path = str(path)
+        # Used by one thread at a time, though not always the one creating it.
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.executescript(_SCHEMA)
+
+    def begin_run(self,
+        tester:str, root_dir:Optional[str]=None, compiler_hash:Optional[str]=None
+    ) -> int:
+        """Begin a run.
+
+        Args:
+            tester: A string of the name of the tester, e.g. 'frontend'.
+            root_dir: [Optional] A string of path to the directory of the run.
+            compiler_hash: [Optional] A string of the digest of the compiler tested.
+
+        Returns:
+            The id of the run.
+        """
+        with self.conn:
+            cursor = self.conn.execute(
+                'INSERT INTO runs (tester, root_dir, compiler_hash, started) VALUES (?, ?, ?, ?)',
+                (tester, root_dir, compiler_hash, time.time())
+            )
+        return cursor.lastrowid
+
+    def add(self,
+        run_id:int, path:str, status:str, note:str='', stages:Optional[Dict[str, float]]=None,
+        returncode:Optional[int]=None, output_size:Optional[int]=None,
+        max_rss:Optional[int]=None
+    ) -> None:
+        """Add the record of a testcase to a run.
+
+        Args:
+            run_id: The id of the run.
+            path: A string of path to the testcase.
+            status: A string of the completion status of the testcase.
+            note: A string of note on the status.
+            stages: [Optional] A dict mapping stages ('compile', 'link' and 'exec')
+                    to the seconds spent in them.
+            returncode: [Optional] The return code of the program executed.
+            output_size: [Optional] Size of the output of the program in bytes.
+            max_rss: [Optional] Peak resident set size of the program in KiB.
+        """
+        stages = stages or {}
+        with self.conn:
+            self.conn.execute(
+                'INSERT INTO cases VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (
+                    run_id, str(path), status, note, stages.get('compile'),
+                    stages.get('link'), stages.get('exec'), returncode, output_size,
+                    max_rss
+                )
+            )
+
+    def end_run(self, run_id:int, stat:str='') -> None:
+        with self.conn:
+            self.conn.execute(
+                'UPDATE runs SET finished = ?, stat = ? WHERE id = ?',
+                (time.time(), stat.strip(), run_id)
+            )
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def latest_run(self, tester:Optional[str]=None) -> Optional[int]:
+        if tester is None:
+            row = self.conn.execute('SELECT MAX(id) FROM runs').fetchone()
+        else:
+            row = self.conn.execute(
+                'SELECT MAX(id) FROM runs WHERE tester = ?', (tester,)
+            ).fetchone()
+        return row[0]
+
+    def runs(self, limit:int=20) -> List[Tuple]:
+        """Get the latest runs as (id, tester, root_dir, started, stat), latest first.
+        """
+        return self.conn.execute(
+            'SELECT id, tester, root_dir, started, stat FROM runs ORDER BY id DESC LIMIT ?',
+            (limit,)
+        ).fetchall()
+
+    def slowest(self, run_id:Optional[int]=None, limit:int=10) -> List[Tuple]:
+        """Get the testcases of a run (the latest by default) spending the most time
+        executing, as (path, exec_s, status), slowest first.
+        """
+        if run_id is None:
+            run_id = self.latest_run()
+        return self.conn.execute(
+            'SELECT path, exec_s, status FROM cases WHERE run_id = ? AND exec_s IS NOT NULL '
+            'ORDER BY exec_s DESC LIMIT ?',
+            (run_id, limit)
+        ).fetchall()
+
+    def newly_failing(self, since:int, run_id:Optional[int]=None) -> List[Tuple]:
+        """Get the testcases accepted in a run but failed in a later one (the latest
+        of the same tester by default), as (path, status, note).
+        """
+        if run_id is None:
+            tester = self.conn.execute(
+                'SELECT tester FROM runs WHERE id = ?', (since,)
+            ).fetchone()
+            run_id = self.latest_run(tester[0] if tester else None)
+        return self.conn.execute(
+            'SELECT cur.path, cur.status, cur.note FROM cases cur '
+            'JOIN cases old ON old.path = cur.path AND old.run_id = ? '
+            'WHERE cur.run_id = ? AND old.status = ? AND cur.status != ? '
+            'ORDER BY cur.path',
+            (since, run_id, ACCEPTED, ACCEPTED)
+        ).fetchall()
+
+    def trend(self, path:str, limit:int=20) -> List[Tuple]:
+        """Get the results of a testcase in the latest runs, as (run_id, started,
+        status, compile_s, exec_s), oldest first.
+        """
+        rows = self.conn.execute(
+            'SELECT c.run_id, r.started, c.status, c.compile_s, c.exec_s FROM cases c '
+            'JOIN runs r ON r.id = c.run_id WHERE c.path = ? '
+            'ORDER BY c.run_id DESC LIMIT ?',
+            (str(path), limit)
+        ).fetchall()
+        return rows[::-1]
+
+
+def _seconds(s:Optional[float]) -> str:
+    return '-' if s is None else f'{s:.3f}s'
+
+
+def _when(t:float) -> str:
+    return time.strftime('%m%d-%H%M%S', time.localtime(t))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Query the results of the testers.')
+    parser.add_argument('db', help='path to the results database, e.g. out/results.db')
+    commands = parser.add_subparsers(dest='command', required=True)
+    runs_parser = commands.add_parser('runs', help='list the latest runs')
+    runs_parser.add_argument('-n', type=int, default=20)
+    slowest_parser = commands.add_parser('slowest', help='list the slowest cases of a run')
+    slowest_parser.add_argument('--run', type=int, default=None)
+    slowest_parser.add_argument('-n', type=int, default=10)
+    failing_parser = commands.add_parser('newly-failing', help='list cases failing since a run')
+    failing_parser.add_argument('since', type=int)
+    failing_parser.add_argument('--run', type=int, default=None)
+    trend_parser = commands.add_parser('trend', help='show the trend of a case')
+    trend_parser.add_argument('path')
+    trend_parser.add_argument('-n', type=int, default=20)
+    args = parser.parse_args()
+
+    store = ResultsStore(args.db)
+    if args.command == 'runs':
+        for run_id, tester, root_dir, started, stat in store.runs(args.n):
+            print(f'{run_id:>5}  {_when(started)}  {tester:<8}  {root_dir or ""}  {stat or ""}')
+    elif args.command == 'slowest':
+        for path, exec_s, status in store.slowest(args.run, args.n):
+            print(f'{_seconds(exec_s):>10}  {path}  {status}')
+    elif args.command == 'newly-failing':
+        for path, status, note in store.newly_failing(args.since, args.run):
+            print(f'{path}  {status}' + (f' ({note})' if note else ''))
+    elif args.command == 'trend':
+        for run_id, started, status, compile_s, exec_s in store.trend(args.path, args.n):
+            print(
+                f'{run_id:>5}  {_when(started)}  {status:<22}'
+                f'  compile {_seconds(compile_s):>9}  exec {_seconds(exec_s):>9}'
+            )
+    store.close()
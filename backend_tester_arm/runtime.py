@@ -0,0 +1,150 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+# The same in all the testers: frontend/, backend_tester_x86/ and backend_tester_arm/.
+
+
+def _toolchain_version(cc:str) -> bytes:
+    try:
+        return subprocess.run(
+            [cc, '--version'], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        ).stdout.split(b'\n')[0]
+    except OSError:
+        return b''
+
+
+def _build_cached(
+    cache_dir:str, name:str, salt:bytes, sources:Iterable[Path],
+    build:Callable[[Path, Path], bool]
+) -> Optional[Path]:
+    """Build a file once, cached under cache_dir by the hash of its sources.
+
+    Args:
+        cache_dir: A string of path to the directory to keep the files built.
+        name: A string of the file name, with '{}' for the hash.
+        salt: Bytes of what else the file depends on, e.g. the compiler version.
+        sources: Paths to the sources, those not existing skipped.
+        build: A function building the file into the given Path, in the given
+                temporary directory, returning if it succeeded.
+
+    Returns:
+        A Path to the file built, or None if failed to build.
+    """
+    h = hashlib.sha256(salt)
+    for path in sources:
+        if path.exists():
+            h.update(path.read_bytes())
+    target = Path(cache_dir)/name.format(h.hexdigest()[:16])
+    if target.exists():
+        return target
+
+    os.makedirs(cache_dir, exist_ok=True)
+    # Build aside and move in place at once, so that no one uses a partial file.
+    tmp_dir = Path(tempfile.mkdtemp(prefix='.tmp-', dir=cache_dir))
+    try:
+        tmp_target = tmp_dir/name.format('')
+        if not build(tmp_dir, tmp_target):
+            return None
+        os.replace(tmp_target, target)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return target
+
+
+def build_runtime(
+    source:str='sylib.c', cache_dir:str='.sylib-cache', fallback:Optional[str]='libsysy.a',
+    cc:str='gcc', cflags:str='-O2'
+) -> Optional[Path]:
+    """Build the SysY runtime into a static archive once, to link all testcases with.
+
+    The archive is cached under cache_dir by the hash of the sources (sylib.c and
+    the sylib.h next to it), the compiler version and the flags, so it is rebuilt
+    only when any of them changes.
+
+    Args:
+        source: A string of path to sylib.c.
+        cache_dir: A string of path to the directory to keep the archives built.
+        fallback: [Optional] A string of path to a prebuilt archive, used if the
+                source is not found or fails to build.
+        cc: A string of the C compiler.
+        cflags: A string of the flags to compile the runtime with.
+
+    Returns:
+        A Path to the static archive of the runtime, or None if it fails to build
+        with no fallback.
+    """
+    source = Path(source)
+    if not source.exists():
+        return Path(fallback) if fallback is not None else None
+
+    def build(tmp_dir:Path, tmp_archive:Path) -> bool:
+        obj = tmp_dir/'sylib.o'
+        try:
+            return subprocess.run(
+                [cc, *cflags.split(), '-c', str(source), '-o', str(obj)],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            ).returncode == 0 and subprocess.run(
+                ['ar', 'rcs', str(tmp_archive), str(obj)],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            ).returncode == 0
+        except OSError:
+            # The compiler or ar not installed.
+            return False
+
+    archive = _build_cached(
+        cache_dir, 'libsysy-{}.a', cflags.encode() + _toolchain_version(cc),
+        (source, source.with_suffix('.h')), build
+    )
+    if archive is None:
+        if fallback is None:
+            print(f'Failed to build the runtime from {source} with {cc}.')
+            return None
+        print(f'Failed to build the runtime from {source}, fall back to {fallback}.')
+        return Path(fallback)
+    return archive
+
+
+def build_runtime_bc(
+    source:str='sylib.ll', cache_dir:str='.sylib-cache', llvm_as:str='llvm-as'
+) -> Path:
+    """Assemble the SysY runtime in LLVM IR into bitcode once, so that it is not
+    parsed as text again for linking each testcase.
+
+    The bitcode is cached under cache_dir by the hash of the source and the version
+    of llvm-as, so it is assembled again only when either of them changes.
+
+    Args:
+        source: A string of path to sylib.ll.
+        cache_dir: A string of path to the directory to keep the bitcode assembled.
+        llvm_as: A string of the LLVM assembler.
+
+    Returns:
+        A Path to the bitcode of the runtime, or to the source itself if it fails to
+        be assembled (which can be linked as well).
+    """
+    source = Path(source)
+    if not source.exists():
+        return source
+
+    def build(tmp_dir:Path, tmp_bc:Path) -> bool:
+        try:
+            return subprocess.run(
+                [llvm_as, str(source), '-o', str(tmp_bc)],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            ).returncode == 0
+        except OSError:
+            # llvm-as not installed.
+            return False
+
+    bc = _build_cached(
+        cache_dir, 'sylib-{}.bc', _toolchain_version(llvm_as), (source,), build
+    )
+    if bc is None:
+        print(f'Failed to assemble the runtime {source}, link with it as is.')
+        return source
+    return bc
@@ -0,0 +1,168 @@
+import csv
+import json
+import re
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+
+# Lines printed to stderr by the SysY runtime (see sysyrt/sylib.c).
+_TIMER_LINE = re.compile(r'Timer@(\d+)-(\d+): (\d+)H-(\d+)M-(\d+)S-(\d+)us')
+_TOTAL_LINE = re.compile(r'TOTAL: (\d+)H-(\d+)M-(\d+)S-(\d+)us')
+
+
+class Timer(NamedTuple):
+    """A region timed by _sysy_starttime/_sysy_stoptime.
+
+    Attributes:
+        start_line: The line number of starttime() in the source.
+        stop_line: The line number of stoptime() in the source.
+        us: Microseconds spent in the region.
+    """
+    start_line: int
+    stop_line: int
+    us: int
+
+
+def _to_us(h:str, m:str, s:str, us:str) -> int:
+    return ((int(h) * 60 + int(m)) * 60 + int(s)) * 1000000 + int(us)
+
+
+def parse_sysy_timers(stderr:str) -> List[Timer]:
+    """Parse the timers reported to stderr by the SysY runtime.
+    """
+    return [
+        Timer(int(m.group(1)), int(m.group(2)), _to_us(*m.groups()[2:]))
+        for m in _TIMER_LINE.finditer(stderr)
+    ]
+
+
+def parse_sysy_total(stderr:str) -> Optional[int]:
+    """Parse the TOTAL line reported to stderr by the SysY runtime, in microseconds.
+    """
+    m = _TOTAL_LINE.search(stderr)
+    return _to_us(*m.groups()) if m else None
+
+
+class CaseTiming:
+    """Timing of the execution of a single testcase.
+
+    Attributes:
+        path: A string of the path to the testcase source.
+        wall_time: Wall-clock seconds of the execution.
+        max_rss: Peak resident set size of the execution in KiB, or None if unknown.
+        timers: A list of Timers reported by the SysY runtime.
+        total_us: Microseconds of all the timed regions, or None if not reported.
+    """
+
+    def __init__(self,
+        path:str, wall_time:float, max_rss:Optional[int], stderr:str=''
+    ) -> None:
+        """Initialize a CaseTiming, parsing the timers from the stderr of the execution.
+        """
+        self.path = str(path)
+        self.wall_time = wall_time
+        self.max_rss = max_rss
+        self.timers = parse_sysy_timers(stderr)
+        # The TOTAL line doesn't carry between units, so sum up the timers instead.
+        self.total_us = sum(t.us for t in self.timers) if self.timers \
+            else parse_sysy_total(stderr)
+
+    def seconds(self) -> float:
+        """Get the seconds to compare across runs: the time of the timed regions
+        if reported, otherwise the wall-clock time of the execution.
+        """
+        return self.total_us / 1e6 if self.total_us is not None else self.wall_time
+
+    def to_dict(self) -> Dict:
+        return {
+            'path': self.path,
+            'wall_time': round(self.wall_time, 6),
+            'max_rss': self.max_rss,
+            'total_us': self.total_us,
+            'timers': [t._asdict() for t in self.timers],
+        }
+
+
+class TimingReport:
+    """TimingReport collects the timing of testcases in a run and compares them
+    with a baseline (the timing.json of a previous run).
+
+    Attributes:
+        timings: A list of CaseTimings in the order of the testcases.
+        baseline: A dict mapping testcase paths to seconds of the baseline run.
+        threshold: The relative slowdown beyond which a testcase is flagged.
+        min_seconds: The absolute slowdown under which a testcase is never flagged,
+                    for short testcases to not be flagged by noises.
+    """
+
+    def __init__(self,
+        baseline_path:Optional[str]=None, threshold:float=0.1, min_seconds:float=0.01
+    ) -> None:
+        self.timings = []
+        self.baseline = {}
+        self.threshold = threshold
+        self.min_seconds = min_seconds
+        if baseline_path is not None and Path(baseline_path).exists():
+            with open(baseline_path) as f:
+                for case in json.load(f)['cases']:
+                    total_us = case.get('total_us')
+                    self.baseline[case['path']] = \
+                        total_us / 1e6 if total_us is not None else case['wall_time']
+
+    def add(self, timing:CaseTiming) -> None:
+        self.timings.append(timing)
+
+    def slowdown(self, timing:CaseTiming) -> Optional[float]:
+        """Get the ratio of the time of a testcase to its baseline, or None if
+        the testcase is not in the baseline.
+        """
+        base = self.baseline.get(timing.path)
+        if base is None:
+            return None
+        return timing.seconds() / base if base > 0 else float('inf')
+
+    def regressed(self, timing:CaseTiming) -> bool:
+        """Check if a testcase slowed down beyond the threshold.
+        """
+        ratio = self.slowdown(timing)
+        return ratio is not None and ratio > 1 + self.threshold \
+            and timing.seconds() - self.baseline[timing.path] > self.min_seconds
+
+    def regressions(self) -> List[CaseTiming]:
+        return [t for t in self.timings if self.regressed(t)]
+
+    def write(self, dest_dir:str) -> None:
+        """Write the timing table as timing.csv and timing.json under the given directory.
+        """
+        with open(Path(dest_dir)/'timing.json', 'w') as f:
+            json.dump({'cases': [t.to_dict() for t in self.timings]}, f, indent=1)
+        with open(Path(dest_dir)/'timing.csv', 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow([
+                'testcase', 'wall_time_s', 'max_rss_kb', 'total_us', 'timers',
+                'baseline_s', 'ratio', 'regressed'
+            ])
+            for t in self.timings:
+                ratio = self.slowdown(t)
+                writer.writerow([
+                    t.path, f'{t.wall_time:.6f}', '' if t.max_rss is None else t.max_rss,
+                    '' if t.total_us is None else t.total_us,
+                    ';'.join(f'{x.start_line}-{x.stop_line}:{x.us}' for x in t.timers),
+                    '' if ratio is None else f'{self.baseline[t.path]:.6f}',
+                    '' if ratio is None else f'{ratio:.3f}',
+                    int(self.regressed(t))
+                ])
+
+    def stat_line(self) -> str:
+        """Get a line summarizing the testcases slowed down since the baseline.
+        """
+        regressions = self.regressions()
+        line = (
+            f'Timing: {len(regressions)} slower than baseline '
+            f'by >{self.threshold:.0%} ({len(self.baseline)} in baseline)'
+        )
+        if regressions:
+            line += ': ' + ', '.join(
+                f'{t.path} x{self.slowdown(t):.2f}' for t in regressions
+            )
+        return line + '\n'
@@ -0,0 +1,118 @@
+import json
+import os
+import socket
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from caseloader import TestCase
+
+
+# See backend_tester_arm/agent.py for the wire format.
+DEFAULT_PORT = 7070
+CHUNK_SIZE = 1 << 16
+# The environment variable of the token shared with the agent, if not given.
+TOKEN_ENV = 'CBIAS_AGENT_TOKEN'
+
+
+class AgentClient:
+    """AgentClient sends batches of testcases to the agent on the Raspberry Pi
+    (see backend_tester_arm/agent.py) and receives the results.
+
+    Sending never waits for results, so the agent receives the next batch while
+    testing the current one. Results are read with results(), preferably in another
+    thread than the one sending.
+    """
+
+    def __init__(self, host:str, port:int=DEFAULT_PORT, token:Optional[str]=None) -> None:
+        """Connect to the agent, presenting the token shared with it.
+
+        Args:
+            token: [Optional] A string of the token shared with the agent. By default,
+                    taken from the environment variable CBIAS_AGENT_TOKEN.
+
+        Raises:
+            ConnectionError: If the agent refuses the token.
+        """
+        if token is None:
+            token = os.environ.get(TOKEN_ENV, '')
+        self.sock = socket.create_connection((host, port))
+        self.rfile = self.sock.makefile('rb')
+        self.wfile = self.sock.makefile('wb')
+        self._lock = threading.Lock()
+        self.n_batches = 0
+        self.wfile.write((json.dumps({'type': 'hello', 'token': token}) + '\n').encode())
+        self.wfile.flush()
+        reply = json.loads(self.rfile.readline() or 'null')
+        if not isinstance(reply, dict) or reply.get('type') != 'welcome':
+            self.close()
+            raise ConnectionError(
+                'refused by the agent: '
+                + (reply.get('message', '') if isinstance(reply, dict) else 'connection closed')
+            )
+
+    def send_batch(self, testcases:List[TestCase], asm_dir:str, echo_ret:bool=True) -> int:
+        """Send a batch of testcases, i.e. their assembly, inputs and standard outputs.
+
+        Args:
+            testcases: A list of the TestCases compiled.
+            asm_dir: A string of path to the directory of the assembly generated.
+            echo_ret: Bool indicating if to echo the process return codes to the output.
+
+        Returns:
+            The id of the batch, which comes with the results of it.
+        """
+        files = []
+        for tc in testcases:
+            files.append((tc.s_name, os.path.join(asm_dir, tc.s_name)))
+            if tc.in_path is not None:
+                files.append((f'in/{tc.name}.in', tc.in_path))
+            files.append((f'std_out/{tc.name}.out', tc.std_out_path))
+        with self._lock:
+            batch_id = self.n_batches
+            self.n_batches += 1
+            header = {
+                'type': 'batch', 'id': batch_id, 'echo': echo_ret,
+                'cases': [tc.name for tc in testcases],
+                'files': [
+                    {'path': path, 'size': os.path.getsize(src)} for path, src in files
+                ],
+            }
+            self.wfile.write((json.dumps(header) + '\n').encode())
+            for _, src in files:
+                with open(src, 'rb') as f:
+                    for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                        self.wfile.write(chunk)
+            self.wfile.flush()
+        return batch_id
+
+    def finish(self) -> None:
+        """Tell the agent no more batches are coming. The agent says goodbye (and
+        results() ends) after testing all the batches sent.
+        """
+        with self._lock:
+            self.wfile.write((json.dumps({'type': 'end'}) + '\n').encode())
+            self.wfile.flush()
+
+    def results(self) -> Iterator[Dict]:
+        """Iterate over the messages of results ('result' for a testcase and 'done'
+        for a batch, or 'error' for a batch failed to be tested) from the agent until
+        it says goodbye.
+        """
+        for line in self.rfile:
+            message = json.loads(line)
+            if message['type'] == 'bye':
+                return
+            yield message
+        raise ConnectionError('connection to the agent closed unexpectedly')
+
+    def close(self) -> None:
+        self.rfile.close()
+        self.wfile.close()
+        self.sock.close()
+
+
+def parse_address(address:str) -> Tuple[str, int]:
+    """Parse an address of the agent like 'host' or 'host:port'.
+    """
+    host, _, port = address.partition(':')
+    return host, int(port) if port else DEFAULT_PORT
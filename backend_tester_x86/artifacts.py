@@ -0,0 +1,318 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    # Optional, for the 'zstd' compression only.
+    zstandard = None
+
+
+# Name of the index of the artifacts archived, under each run directory.
+MANIFEST = 'artifacts.json'
+# Suffixes of the blobs by the compression.
+SUFFIXES = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+# Blobs stored or reused within this are never collected, as a run may be archiving
+# them before its manifest is written.
+GRACE_SECONDS = 3600
+CHUNK_SIZE = 1 << 20
+
+
+class ArtifactStore:
+    """A content-addressed store of the files generated by runs (e.g. the ir/ and out/
+    directories of each testgen-* directory), so that the near-identical artifacts of
+    many runs take the space of one.
+
+    Each distinct content is stored once, as a blob named by its SHA-256 hash and
+    compressed if configured:
+
+        <store_dir>/objects/<hash[:2]>/<hash>[.gz|.zst]
+
+    Archiving a run moves its files into the store and writes artifacts.json into the
+    run directory, mapping the paths of the files (relative to the run directory) to
+    their blobs; restore() brings them back. The runs archived are registered under
+    <store_dir>/runs/, so that runs of all the testers can share a store.
+
+    Runs beyond the retention policy are removed, and then the blobs no longer
+    referenced by any run (see collect_garbage).
+
+    Attributes:
+        store_dir: A Path to the root directory of the store.
+        compression: None, 'gzip', or 'zstd' (which needs the zstandard package).
+        keep_last: [Optional] Number of the latest runs to keep.
+        keep_seconds: [Optional] Age in seconds within which runs are kept. If both
+                policies are given, runs kept by either are kept. If neither, all.
+    """
+
+    def __init__(self,
+        store_dir:str, compression:Optional[str]='gzip', keep_last:Optional[int]=None,
+        keep_seconds:Optional[float]=None
+    ) -> None:
+        """Initialize an ArtifactStore, creating the store directory if not existing.
+        """
+        if compression not in SUFFIXES:
+            raise ValueError(f'unknown compression: {compression}')
+        if compression == 'zstd' and zstandard is None:
+            print('zstandard not installed, fall back to gzip.')
+            compression = 'gzip'
+        self.store_dir = Path(store_dir)
+        self.compression = compression
+        self.keep_last = keep_last
+        self.keep_seconds = keep_seconds
+        self.objects_dir = self.store_dir/'objects'
+        self.runs_dir = self.store_dir/'runs'
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.runs_dir, exist_ok=True)
+
+    def put(self, path:Path) -> Tuple[str, bool]:
+        """Store the content of a file, unless stored already.
+
+        Returns:
+            A string of the name of the blob relative to the objects directory, and
+            a bool indicating if it is newly stored.
+        """
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                h.update(chunk)
+        digest = h.hexdigest()
+        # Stored by any compression.
+        for suffix in SUFFIXES.values():
+            blob = f'{digest[:2]}/{digest}{suffix}'
+            try:
+                # Touched, so that a collection which has not seen the manifest of
+                # this run yet leaves it alone for the grace period, as a new blob.
+                os.utime(self.objects_dir/blob)
+                return blob, False
+            except FileNotFoundError:
+                pass
+
+        blob = f'{digest[:2]}/{digest}{SUFFIXES[self.compression]}'
+        os.makedirs(self.objects_dir/digest[:2], exist_ok=True)
+        # Written aside and moved in place at once, so that no one reads a partial blob.
+        fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=self.objects_dir/digest[:2])
+        try:
+            with open(path, 'rb') as src, os.fdopen(fd, 'wb') as dst:
+                if self.compression == 'gzip':
+                    with gzip.GzipFile(fileobj=dst, mode='wb', compresslevel=6, mtime=0) as z:
+                        shutil.copyfileobj(src, z, CHUNK_SIZE)
+                elif self.compression == 'zstd':
+                    with zstandard.ZstdCompressor().stream_writer(dst, closefd=False) as z:
+                        shutil.copyfileobj(src, z, CHUNK_SIZE)
+                else:
+                    shutil.copyfileobj(src, dst, CHUNK_SIZE)
+            os.replace(tmp_path, self.objects_dir/blob)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return blob, True
+
+    def get(self, blob:str, dest:Path) -> None:
+        """Restore the content of a blob to a file.
+        """
+        with open(self.objects_dir/blob, 'rb') as src, open(dest, 'wb') as dst:
+            if blob.endswith(SUFFIXES['gzip']):
+                with gzip.GzipFile(fileobj=src, mode='rb') as z:
+                    shutil.copyfileobj(z, dst, CHUNK_SIZE)
+            elif blob.endswith(SUFFIXES['zstd']):
+                if zstandard is None:
+                    raise RuntimeError(f'zstandard not installed to restore {blob}')
+                with zstandard.ZstdDecompressor().stream_reader(src) as z:
+                    shutil.copyfileobj(z, dst, CHUNK_SIZE)
+            else:
+                shutil.copyfileobj(src, dst, CHUNK_SIZE)
+
+    def archive(self, run_dir:Path, subdirs:Iterable[str]) -> str:
+        """Move the files under the given subdirectories of a run into the store, and
+        record them in the manifest of the run (merged with that of the previous
+        archiving, if any).
+
+        Args:
+            run_dir: A Path to the run directory, e.g. out/testgen-1017-225528.
+            subdirs: Strings of the names of the subdirectories, e.g. 'ir' and 'out'.
+
+        Returns:
+            A line summarizing the files archived.
+        """
+        run_dir = Path(run_dir)
+        manifest = load_manifest(run_dir)
+        n_files = total = stored = 0
+        for subdir in subdirs:
+            for path in sorted((run_dir/subdir).rglob('*')):
+                if not path.is_file() or path.is_symlink():
+                    continue
+                size = path.stat().st_size
+                blob, new = self.put(path)
+                manifest[path.relative_to(run_dir).as_posix()] = {'blob': blob, 'size': size}
+                path.unlink()
+                n_files += 1
+                total += size
+                if new:
+                    stored += (self.objects_dir/blob).stat().st_size
+        tmp_path = run_dir/(MANIFEST + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, run_dir/MANIFEST)
+        self.register(run_dir)
+        return (
+            f'Artifacts: {n_files} files, {total / (1 << 20):.2f} MiB archived, '
+            f'{stored / (1 << 20):.2f} MiB newly stored\n'
+        )
+
+    def restore(self, run_dir:Path, dest:Optional[Path]=None) -> int:
+        """Bring the files archived of a run back, into the run directory or dest.
+
+        Returns:
+            Number of the files restored. Those existing already are skipped.
+        """
+        run_dir = Path(run_dir)
+        dest = Path(dest) if dest is not None else run_dir
+        restored = 0
+        for rel_path, entry in load_manifest(run_dir).items():
+            path = dest/rel_path
+            if path.exists():
+                continue
+            os.makedirs(path.parent, exist_ok=True)
+            self.get(entry['blob'], path)
+            restored += 1
+        return restored
+
+    def register(self, run_dir:Path) -> None:
+        """Register a run as referencing the store.
+        """
+        run_path = str(Path(run_dir).resolve())
+        name = hashlib.sha256(run_path.encode()).hexdigest()[:16]
+        (self.runs_dir/name).write_text(run_path)
+
+    def runs(self) -> List[Path]:
+        """List the runs registered, the latest first, dropping those gone.
+        """
+        runs = []
+        for ref in self.runs_dir.iterdir():
+            run_dir = Path(ref.read_text())
+            if not (run_dir/MANIFEST).exists():
+                ref.unlink()
+                continue
+            runs.append(run_dir)
+        return sorted(runs, key=lambda run_dir: (run_dir/MANIFEST).stat().st_mtime, reverse=True)
+
+    def expired(self, runs:List[Path]) -> List[Path]:
+        """Find the runs to be removed by the retention policy, of the runs given
+        latest first.
+        """
+        if self.keep_last is None and self.keep_seconds is None:
+            return []
+        now = time.time()
+        expired = []
+        for i, run_dir in enumerate(runs):
+            if self.keep_last is not None and i < self.keep_last:
+                continue
+            if self.keep_seconds is not None and \
+                now - (run_dir/MANIFEST).stat().st_mtime < self.keep_seconds:
+                continue
+            expired.append(run_dir)
+        return expired
+
+    def collect_garbage(self, dry_run:bool=False) -> str:
+        """Remove the runs beyond the retention policy, as whole directories, and then
+        the blobs referenced by none of the remaining runs.
+
+        Args:
+            dry_run: Bool indicating if to only count what would be removed.
+
+        Returns:
+            A line summarizing what is removed.
+        """
+        runs = self.runs()
+        expired = self.expired(runs)
+        if not dry_run:
+            for run_dir in expired:
+                shutil.rmtree(run_dir, ignore_errors=True)
+        expired_set = set(expired)
+        referenced = set()
+        for run_dir in runs:
+            if run_dir not in expired_set:
+                referenced.update(entry['blob'] for entry in load_manifest(run_dir).values())
+
+        n_blobs = freed = 0
+        now = time.time()
+        for path in self.objects_dir.glob('*/*'):
+            blob = f'{path.parent.name}/{path.name}'
+            if blob in referenced:
+                continue
+            st = path.stat()
+            if now - st.st_mtime < GRACE_SECONDS:
+                continue
+            if not dry_run:
+                path.unlink()
+            n_blobs += 1
+            freed += st.st_size
+        if not dry_run:
+            # Drops the references to the runs removed.
+            self.runs()
+        return (
+            f'GC: {len(expired)} runs and {n_blobs} blobs removed, '
+            f'{freed / (1 << 20):.2f} MiB of blobs freed\n'
+        )
+
+    def size(self) -> int:
+        """Get the total size of the blobs in bytes.
+        """
+        return sum(path.stat().st_size for path in self.objects_dir.glob('*/*'))
+
+
+def load_manifest(run_dir:Path) -> Dict[str, Dict]:
+    """Load the manifest of the artifacts archived of a run, or an empty one if none.
+    """
+    path = Path(run_dir)/MANIFEST
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _duration(text:str) -> float:
+    """Parse a duration, e.g. '90s', '30m', '12h' or '7d', into seconds.
+    """
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    if text[-1:] in units:
+        return float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Manage the store of the artifacts of runs.')
+    parser.add_argument('store', help='path to the artifact store, e.g. out/.artifacts')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('runs', help='list the runs archived')
+    gc_parser = commands.add_parser('gc', help='remove old runs and unreferenced blobs')
+    gc_parser.add_argument('--keep-last', type=int, default=None)
+    gc_parser.add_argument('--keep-newer', type=_duration, default=None,
+        help='e.g. 12h or 7d')
+    gc_parser.add_argument('--dry-run', action='store_true')
+    restore_parser = commands.add_parser('restore', help='restore the files of a run')
+    restore_parser.add_argument('run_dir')
+    restore_parser.add_argument('--dest', default=None)
+    args = parser.parse_args()
+
+    if args.command == 'gc':
+        store = ArtifactStore(args.store, keep_last=args.keep_last, keep_seconds=args.keep_newer)
+        print(store.collect_garbage(args.dry_run), end='')
+        print(f'Store: {store.size() / (1 << 20):.2f} MiB')
+    else:
+        store = ArtifactStore(args.store)
+        if args.command == 'runs':
+            for run_dir in store.runs():
+                manifest = load_manifest(run_dir)
+                size = sum(entry['size'] for entry in manifest.values())
+                print(f'{run_dir}  {len(manifest):>6} files  {size / (1 << 20):>10.2f} MiB')
+        elif args.command == 'restore':
+            print(f'{store.restore(args.run_dir, args.dest)} files restored')
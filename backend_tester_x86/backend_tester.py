@@ -1,24 +1,129 @@
 import subprocess
+import hashlib
 import os
-import shutil
+import queue
+import time
+import threading
+from collections import Counter
+from collections.abc import Sized
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from mySftp import MainWindow
 import filecmp
-from typing import List, Optional
+from typing import (
+    Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, TextIO, Tuple
+)
 
-from caseloader import TestCase, Loader
+from caseloader import FailureManifest, TestCase, Loader, Scheme, unique_names
+from compiler_daemon import CompilerDaemon
+from buildcache import BuildCache
+from artifacts import ArtifactStore
+from compiletime import CompileReport
+from uploader import BatchUploader
+from agent_client import AgentClient, parse_address
+from results_db import ResultsStore
+from runtime import build_runtime
+from matcher import run_and_match
+from limits import Limits, StageTimeout, run_stage
+from progress import Progress
+from pipeline import (
+    ACCEPTED, COMPILATION_ERROR, WRONG_ANSWER, CaseContext, CaseResult, Pipeline,
+    Stage, StageFailed
+)
+
+
+# Abbreviations of the completion status reported by the agent on the Raspberry Pi.
+STATUS_ABBRS = [
+    ('AC', ACCEPTED),
+    ('CE', COMPILATION_ERROR),
+    ('WA', WRONG_ANSWER),
+    ('TLE', 'Time Limit Exceeded'),
+    ('MLE', 'Memory Limit Exceeded'),
+    ('RE', 'Runtime Error'),
+    ('TF', 'Transmit Fail'),
+]
+# Status of the testcases compiled, before shipped.
+COMPILED = 'Compiled'
+# Abbreviations of the completion status of uploading.
+UPLOAD_STATUS_ABBRS = [
+    ('TS', 'Transmitted'),
+    ('CE', COMPILATION_ERROR),
+    # The compiler running out of compile_timeout.
+    ('TLE', 'Time Limit Exceeded'),
+    ('ER', 'Transmit Fail'),
+]
+
+
+def stat_line(counts:Counter, total:int, abbrs:List[Tuple[str, str]]) -> str:
+    """Format the statistical conclusion of testcases in stat.log.
+
+    Args:
+        counts: A Counter of the statuses of the testcases.
+        total: Number of the testcases.
+        abbrs: A list of (abbreviation, status) pairs of the statuses to count.
+    """
+    return ', '.join(f'{abbr}: {counts[status]:>3}/{total}' for abbr, status in abbrs) + '\n'
+
+
+class CrossToolchain(NamedTuple):
+    """An ARM cross toolchain, and the user-mode emulator to run the executables
+    linked by it on x86 (see BackendAutoTester.run_emulated).
+
+    Attributes:
+        cc: A string of the cross C compiler to assemble and link with. It has to
+                target Linux (e.g. arm-linux-gnueabihf-gcc), as arm-none-eabi-gcc
+                links bare-metal executables which qemu-arm can't run.
+        cflags: A string of the flags to build the runtime and link with. Linked
+                statically by default, so that no ARM sysroot is needed to run.
+        qemu: A string of the command of the emulator, with its options if any
+                (e.g. 'qemu-arm -L /usr/arm-linux-gnueabihf' for dynamic executables).
+    """
+    cc: str = 'arm-linux-gnueabihf-gcc'
+    cflags: str = '-mcpu=cortex-a7 -mfloat-abi=hard -static'
+    qemu: str = 'qemu-arm'
 
 
 class BackendAutoTester:
     """An auto tester for the backend testing batch of test cases all at once.
     """
 
-    def __init__(self, compiler_path:str, java_path:str, gen_dir:str, sftpArg) -> None:
+    def __init__(self, 
+        compiler_path:str, java_path:str, gen_dir:str, sftpArg, warm_compiler:bool=False,
+        cache_dir:Optional[str]=None, cache_size:int=1 << 30, upload_channels:int=4,
+        results_db:Optional[str]=None, limits:Optional[Limits]=None,
+        artifacts:Optional[ArtifactStore]=None, jvm_options:str=''
+    ) -> None:
         """Initialize a BackendAutoTester.
+
+        Args:
+            sftpArg: A dict of the SFTP connection to upload files with (see
+                    uploader.BatchUploader.from_args), or None if only run_remote
+                    is to be used.
+            warm_compiler: Bool indicating if to compile testcases with a long-lived JVM
+                    instead of launching a new JVM for each of them.
+            cache_dir: [Optional] A string of path to the directory of a persistent
+                    build cache. Testcases are compiled only if the source or the
+                    compiler has changed since cached.
+            cache_size: The size bound (in bytes) of the build cache.
+            upload_channels: Number of SFTP channels to upload files over concurrently.
+            results_db: [Optional] A string of path to the SQLite database to store
+                    the results of each testcase into (see results_db.py). By default,
+                    results.db under gen_dir.
+            limits: [Optional] The Limits on time for compiling each testcase, and for
+                    linking and executing each tested with run_emulated. Unlimited by
+                    default. Note the memory limit would apply to the emulator as well.
+            artifacts: [Optional] The ArtifactStore to archive the files generated
+                    (under asm/ and out/) into at the end of each run, after which the
+                    runs beyond its retention policy are removed.
+            jvm_options: A string of the options of the JVMs compiling the testcases,
+                    e.g. '-XX:TieredStopAtLevel=1' or '-Xshare:auto', typically from
+                    the "jvm" of the scheme. The seconds compiling each testcase are
+                    written to compile.csv, and summarized in stat.log, to tell if a
+                    tuning helps.
         """
         self.java_path = Path(java_path)
         self.compiler_path = Path(compiler_path)
+        self.jvm_options = jvm_options
         self.root_dir = Path(gen_dir)/Path('testgen-' + datetime.now().strftime(r"%m%d-%H%M%S"))
         self.asm_dir = self.root_dir/"asm"
         self.out_dir = self.root_dir/"out"
@@ -26,14 +131,30 @@ class BackendAutoTester:
         self.stat_path = self.root_dir/"stat.log"
         self.wrongans_dir = self.root_dir/"wa-cases"
         self.compilerr_dir = self.root_dir/"ce-cases"
+        self.failures = FailureManifest(self.root_dir/"failures.jsonl")
         
         self.max_path_width = 45
+        self.compiler_daemon = CompilerDaemon(compiler_path, java_path, jvm_options) \
+            if warm_compiler else None
+        self.build_cache = BuildCache(cache_dir, cache_size) if cache_dir else None
+        self.limits = limits if limits is not None else Limits()
+        self.artifacts = artifacts
+        # Compiled testcases are shipped on (see compile_all).
+        self.pipeline = Pipeline(
+            [Stage('compile', self.compile_asm)], COMPILED, on_failure=self.keep_failed
+        )
+        # The emulated route for compiled testcases: link -> exec -> match, on x86.
+        self.emulation = Pipeline([
+            Stage('link', self.cross_link),
+            Stage('exec', self.exec_emulated),
+            Stage('match', self.match_output),
+        ], on_failure=self.keep_failed)
         self.dst = '/home/pi/test/testgen-' + datetime.now().strftime(r"%m%d-%H%M%S")
         self.dst1 = '/home/pi/test/in'
         self.dst2 = '/home/pi/test/std_out'
 
-        self.sftp = MainWindow(sftpArg)
-        self.sftp.startup()
+        self.sftp = BatchUploader.from_args(sftpArg, upload_channels) \
+            if sftpArg is not None else None
 
         # Create a dir to store generated files.
         os.makedirs(self.root_dir)
@@ -41,90 +162,577 @@ class BackendAutoTester:
         os.makedirs(self.out_dir)
         os.makedirs(self.wrongans_dir)
         os.makedirs(self.compilerr_dir)
+        self.results_store = ResultsStore(
+            results_db if results_db is not None else Path(gen_dir)/'results.db'
+        )
 
     def run(self, 
-        testcases: List[TestCase], echo_ret:bool=True, terminal_log=True) -> None:
+        testcases: Iterable[TestCase], echo_ret:bool=True, terminal_log=True,
+        jobs:int=1, queue_size:int=8, schemes:Optional[Dict[TestCase, Scheme]]=None
+    ) -> None:
         """Run through all the testcases to generate results.
 
+        Compiling and uploading are pipelined: compiled testcases are put into a
+        bounded queue, which is drained by uploading concurrently, so the network
+        latency is hidden behind compiling (and vice versa).
+
         Args:
+            testcases: TestCases to run, e.g. a Loader, consumed as they are found.
             echo_ret: Bool indicating if to echo the process return codes to .out files.
+            jobs: Number of testcases to compile concurrently.
+            queue_size: Number of compiled testcases allowed to wait for uploading,
+                    beyond which compiling is held back.
+            schemes: [Optional] A dict mapping the testcases to the Schemes they are
+                    of, if run as a batch of several schemes (see run_schemes), filled
+                    in no later than the testcases are found. A stat line is written
+                    for each scheme before the combined one.
+
+        The SFTP connection and the warm JVMs are kept open for the next run, until
+        shutdown() is called.
+
+        On the terminal, the testcases are printed as they are uploaded, below which
+        the testcases in flight, the throughput and the counts so far are shown (see
+        progress.py).
         """
-        # Adjust logging format.
-        new_width = max([len(str(tc.sy_path)) for tc in testcases])
-        if new_width > self.max_path_width:
-            self.max_path_width = new_width
-        # Statistic Info
-        cnt_wrongans = 0
-        cnt_compilerr = 0
-        cnt_trans = 0
+        # Warm up JVMs for compiling.
+        if self.compiler_daemon is not None and not self.compiler_daemon.start(max(jobs, 1)):
+            print('Compiler daemon unavailable, fall back to a JVM per testcase.')
+        if self.build_cache is not None:
+            self.build_cache.reset_stats()
+
+        progress = self.progress(testcases, UPLOAD_STATUS_ABBRS, terminal_log)
 
         # Run.
         with open(self.log_path, 'a+') as log_file, open(self.stat_path, 'a+') as stat_file:
-            # Loop through each test case.
-            for testcase in testcases:                
-                out_path = self.out_dir/testcase.gen_out_name
-                s_path = self.asm_dir/testcase.s_name
+            statuses = {}
+            uploads = {}
 
-                if terminal_log:
-                    print(str(testcase.sy_path).ljust(self.max_path_width, ' ') + f' \tRunning', 
-                    end='\n')
-
-                o_path = self.gen_asm(testcase)
-                if o_path is None:
-                    status = 'Compilation Error'
-                    cnt_compilerr += 1
-                    # Copy the error-compiled testcase to the CE-directory.
-                    p = testcase.copy_to(self.compilerr_dir)
-                    if os.path.exists(s_path):
-                        shutil.copyfile(s_path, p/(s_path.name))
-                else:
-                    print(str(testcase.sy_path).ljust(self.max_path_width, ' ') + f' \tCompiled', 
-                    end='\n')
-                    OK = self.trans_asm(testcase)
-                    if OK == 'ERROR':
-                        status = 'Transmit Fail'
-                        cnt_wrongans += 1
-                    else:
-                        status = 'Transmitted'
-                        cnt_trans += 1
-                log = (
-                    str(testcase.sy_path).ljust(self.max_path_width, ' ')
-                    + f' \t{status}\n'
+            def uploaded(testcase:TestCase, upload:Future) -> None:
+                status = 'Transmitted' if upload.exception() is None and upload.result() \
+                    else 'Transmit Fail'
+                progress.finish(
+                    testcase, status, self.log_line(testcase, status) if terminal_log else ''
                 )
-                log_file.write(log)
+
+            def ship(compiled:Iterator[TestCase]) -> None:
+                for testcase in compiled:
+                    progress.stage(testcase, 'upload')
+                    try:
+                        uploads[testcase] = self.trans_asm(testcase)
+                    except Exception as e:
+                        # Keep draining the queue, or compiling would be blocked.
+                        progress.log(f'Failed to upload {testcase.src_path}: {e}\n')
+                        statuses[testcase] = 'Transmit Fail'
+                        progress.finish(
+                            testcase, statuses[testcase],
+                            self.log_line(testcase, statuses[testcase]) if terminal_log else ''
+                        )
+                        continue
+                    uploads[testcase].add_done_callback(
+                        lambda upload, testcase=testcase: uploaded(testcase, upload)
+                    )
+
+            run_id = self.results_store.begin_run('x86', str(self.root_dir), self.compiler_hash())
+            found = []
+            compile_times = self.compile_all(
+                self.discover(testcases, found), statuses, ship, progress, terminal_log,
+                jobs, queue_size
+            )
+            testcases = found
+            for testcase, upload in uploads.items():
+                statuses[testcase] = 'Transmitted' if upload.result() else 'Transmit Fail'
+            progress.close()
+
+            for testcase in testcases:
+                self.results_store.add(
+                    run_id, testcase.src_path, statuses[testcase],
+                    stages={'compile': compile_times.get(testcase)}
+                )
+                log_file.write(self.log_line(testcase, statuses[testcase]))
+            # Statistical conclusion, of each scheme and then of all.
+            if schemes is not None:
+                scheme_counts = {}
+                for testcase in testcases:
+                    scheme_counts.setdefault(schemes[testcase].name, Counter())[
+                        statuses[testcase]
+                    ] += 1
+                for name, counts in scheme_counts.items():
+                    scheme_conclu = f'[{name}] ' + stat_line(
+                        counts, sum(counts.values()), UPLOAD_STATUS_ABBRS
+                    )
+                    stat_file.write(scheme_conclu)
+                    if terminal_log:
+                        print(scheme_conclu, end='')
+            stat_conclu = stat_line(
+                Counter(statuses.values()), len(testcases), UPLOAD_STATUS_ABBRS
+            )
+            stat_file.write(stat_conclu)
+            if terminal_log:
+                print(stat_conclu, end='')
+            self.results_store.end_run(run_id, stat_conclu)
+            if self.build_cache is not None:
+                stat_file.write(self.build_cache.stat_line())
                 if terminal_log:
-                    print(log, end='')
+                    print(self.build_cache.stat_line(), end='')
+            self.report_compile(testcases, compile_times, stat_file, terminal_log)
+            if self.artifacts is not None:
+                self.archive(stat_file, terminal_log)
+
+    def report_compile(self,
+        testcases:List[TestCase], compile_times:Dict[TestCase, float], stat_file:TextIO,
+        terminal_log=True
+    ) -> None:
+        """Write the seconds compiling the testcases (see compile_all) to compile.csv,
+        and append the summary to stat.log.
+        """
+        report = CompileReport(self.jvm_options, self.compiler_daemon is not None)
+        for testcase in testcases:
+            if testcase in compile_times:
+                report.add(str(testcase.src_path), compile_times[testcase])
+        report.write(self.root_dir)
+        stat_file.write(report.stat_line())
+        if terminal_log:
+            print(report.stat_line(), end='')
+
+    def archive(self, stat_file:TextIO, terminal_log=True) -> None:
+        """Archive the files generated by the run into the artifact store, and collect
+        the garbage of it, appending the summaries to stat.log.
+        """
+        for line in (
+            self.artifacts.archive(self.root_dir, ['asm', 'out']),
+            self.artifacts.collect_garbage()
+        ):
+            stat_file.write(line)
+            if terminal_log:
+                print(line, end='')
+
+    def run_schemes(self,
+        schemes:List[Scheme], terminal_log=True, jobs:int=1, queue_size:int=8
+    ) -> None:
+        """Run several schemes (e.g. the functional and the performance suites) as a
+        single batch, uploaded to the same directory on the Raspberry Pi.
+
+        The testcases of all the schemes are compiled by the same pool of workers as
+        they are found, so that a scheme does not wait for the tail of the previous
+        one, and all of them share this session: the SFTP connection, the warm JVMs
+        and the build cache. Each scheme gets its own stat line in stat.log, followed
+        by the combined one.
+
+        Args:
+            schemes: A list of the Schemes, of which the testcases are logged in order.
+            jobs: Number of testcases to compile concurrently.
+            queue_size: Number of compiled testcases allowed to wait for uploading.
+        """
+        testcase_schemes = {}
+
+        def testcases() -> Iterator[TestCase]:
+            for scheme in schemes:
+                for testcase in scheme.testcases:
+                    testcase_schemes[testcase] = scheme
+                    yield testcase
+
+        self.run(
+            testcases(), terminal_log=terminal_log, jobs=jobs, queue_size=queue_size,
+            schemes=testcase_schemes
+        )
+
+    def shutdown(self) -> None:
+        """Close the SFTP connection (after the uploads pending), and stop the warm
+        JVMs if any.
+        """
+        if self.sftp is not None:
+            self.sftp.close()
+        if self.compiler_daemon is not None:
+            self.compiler_daemon.shutdown()
+
+    
+    def run_remote(self,
+        testcases: Iterable[TestCase], agent_address:str, echo_ret:bool=True,
+        terminal_log=True, jobs:int=1, queue_size:int=8, batch_size:int=8,
+        agent_token:Optional[str]=None) -> None:
+        """Run through all the testcases on the agent on the Raspberry Pi (see
+        backend_tester_arm/agent.py) instead of uploading them.
+
+        Compiled testcases are sent in batches of batch_size. The agent tests a batch
+        while the next one is being compiled and sent, and the results come back case
+        by case as they come out.
+
+        Args:
+            testcases: TestCases to run, e.g. a Loader, consumed as they are found.
+            agent_address: A string of the address of the agent, as 'host:port'.
+            echo_ret: Bool indicating if to echo the process return codes to .out files.
+            jobs: Number of testcases to compile concurrently.
+            queue_size: Number of compiled testcases allowed to wait for sending.
+            batch_size: Number of testcases sent to the agent at a time.
+            agent_token: [Optional] A string of the token shared with the agent. By
+                    default, taken from the environment variable CBIAS_AGENT_TOKEN.
+
+        On the terminal, the testcases are printed as their results come back, below
+        which the testcases in flight, the throughput and the counts so far are shown
+        (see progress.py).
+        """
+        # Warm up JVMs for compiling.
+        if self.compiler_daemon is not None and not self.compiler_daemon.start(max(jobs, 1)):
+            print('Compiler daemon unavailable, fall back to a JVM per testcase.')
+        if self.build_cache is not None:
+            self.build_cache.reset_stats()
+
+        client = AgentClient(*parse_address(agent_address), agent_token)
+        progress = self.progress(testcases, STATUS_ABBRS, terminal_log)
+        found = []
+        # Filled in before the testcases are sent, hence before their results come.
+        by_name = {}
+        statuses = {}
+        # Messages of the results from the agent.
+        results = {}
+
+        def receive() -> None:
+            for message in client.results():
+                if message['type'] == 'error':
+                    progress.log(
+                        f"Batch {message['batch']} failed on the agent: {message['message']}\n"
+                    )
+                if message['type'] != 'result':
+                    continue
+                testcase = by_name[message['case']]
+                statuses[testcase] = message['status']
+                results[testcase] = message
+                progress.finish(
+                    testcase, message['status'],
+                    self.log_line(testcase, message['status'], message.get('note') or '')
+                    if terminal_log else ''
+                )
+
+        def ship(compiled:Iterator[TestCase]) -> None:
+            batch = []
+            for testcase in compiled:
+                progress.stage(testcase, 'agent')
+                batch.append(testcase)
+                if len(batch) >= batch_size:
+                    client.send_batch(batch, self.asm_dir, echo_ret)
+                    batch = []
+            if batch:
+                client.send_batch(batch, self.asm_dir, echo_ret)
+
+        run_id = self.results_store.begin_run(
+            'x86-remote', str(self.root_dir), self.compiler_hash()
+        )
+        receiver = threading.Thread(target=receive)
+        receiver.start()
+        compile_times = {}
+        try:
+            compile_times = self.compile_all(
+                (
+                    by_name.setdefault(testcase.name, testcase)
+                    for testcase in self.discover(testcases, found)
+                ),
+                statuses, ship, progress, terminal_log, jobs, queue_size
+            )
+        finally:
+            client.finish()
+            receiver.join()
+            client.close()
+            progress.close()
+        testcases = found
+
+        with open(self.log_path, 'a+') as log_file, open(self.stat_path, 'a+') as stat_file:
+            counts = Counter()
+            for testcase in testcases:
+                # Sent but never tested, e.g. the agent went down.
+                status = statuses.get(testcase, 'Transmit Fail')
+                counts[status] += 1
+                result = results.get(testcase, {})
+                note = result.get('note')
+                self.results_store.add(
+                    run_id, testcase.src_path, status, note or '',
+                    dict(result.get('stages', {}), compile=compile_times.get(testcase)),
+                    result.get('returncode'), result.get('output_size')
+                )
+                log_file.write(self.log_line(testcase, status, note or ''))
             # Statistical conclusion.
-            stat_conclu = (
-                f'TS: {cnt_trans:>3}/{len(testcases)}, '
-                f'CE: {cnt_compilerr:>3}/{len(testcases)}, '
-                f'ER: {cnt_wrongans:>3}/{len(testcases)}\n'
+            stat_conclu = stat_line(counts, len(testcases), STATUS_ABBRS)
+            stat_file.write(stat_conclu)
+            if terminal_log:
+                print(stat_conclu, end='')
+            self.results_store.end_run(run_id, stat_conclu)
+            if self.build_cache is not None:
+                stat_file.write(self.build_cache.stat_line())
+                if terminal_log:
+                    print(self.build_cache.stat_line(), end='')
+            self.report_compile(testcases, compile_times, stat_file, terminal_log)
+            if self.artifacts is not None:
+                self.archive(stat_file, terminal_log)
+
+    def run_emulated(self,
+        testcases: Iterable[TestCase], echo_ret:bool=True, terminal_log=True,
+        jobs:int=1, queue_size:int=8, exec_jobs:Optional[int]=None,
+        toolchain:Optional[CrossToolchain]=None) -> None:
+        """Run through all the testcases on this machine, with an ARM cross toolchain
+        and a user-mode emulator (qemu-arm) instead of the Raspberry Pi.
+
+        Compiled testcases are linked, executed and matched (see self.emulation) on
+        all the cores while the next ones are compiling. Correctness only: keep the
+        Raspberry Pi (run/run_remote) for the timing of the performance testcases.
+
+        Args:
+            testcases: TestCases to run, e.g. a Loader, consumed as they are found.
+            echo_ret: Bool indicating if to echo the process return codes to .out files.
+            jobs: Number of testcases to compile concurrently.
+            queue_size: Number of compiled testcases allowed to wait for linking.
+            exec_jobs: [Optional] Number of testcases to link and execute concurrently.
+                    By default, the number of cores.
+            toolchain: [Optional] The CrossToolchain to link and execute with. By
+                    default, arm-linux-gnueabihf-gcc and qemu-arm.
+
+        Raises:
+            RuntimeError: If the SysY runtime fails to be cross built, e.g. for the
+                    toolchain not installed.
+
+        On the terminal, the testcases are printed as they finish, below which the
+        testcases in flight, the throughput and the counts so far are shown (see
+        progress.py).
+        """
+        toolchain = toolchain if toolchain is not None else CrossToolchain()
+        # Cross built once for all the testcases. No prebuilt one to fall back to.
+        runtime = build_runtime('sylib.c', '.sylib-cache', None, toolchain.cc, toolchain.cflags)
+        if runtime is None:
+            raise RuntimeError(f'failed to cross build the runtime with {toolchain.cc}')
+
+        # Warm up JVMs for compiling.
+        if self.compiler_daemon is not None and not self.compiler_daemon.start(max(jobs, 1)):
+            print('Compiler daemon unavailable, fall back to a JVM per testcase.')
+        if self.build_cache is not None:
+            self.build_cache.reset_stats()
+
+        statuses = {}
+        emulated = {}
+        executor = ThreadPoolExecutor(max_workers=exec_jobs or os.cpu_count() or 1)
+        progress = self.progress(testcases, STATUS_ABBRS, terminal_log)
+
+        def emulate(testcase:TestCase) -> CaseResult:
+            result = self.emulation.run(
+                testcase, on_stage=progress.stage, echo_ret=echo_ret, toolchain=toolchain,
+                runtime=runtime
+            )
+            progress.finish(
+                testcase, result.status,
+                self.log_line(testcase, result.status, result.note) if terminal_log else ''
             )
+            return result
+
+        def ship(compiled:Iterator[TestCase]) -> None:
+            for testcase in compiled:
+                emulated[testcase] = executor.submit(emulate, testcase)
+
+        run_id = self.results_store.begin_run(
+            'x86-qemu', str(self.root_dir), self.compiler_hash()
+        )
+        found = []
+        try:
+            compile_times = self.compile_all(
+                self.discover(testcases, found), statuses, ship, progress, terminal_log,
+                jobs, queue_size
+            )
+        finally:
+            executor.shutdown()
+            progress.close()
+        testcases = found
+
+        with open(self.log_path, 'a+') as log_file, open(self.stat_path, 'a+') as stat_file:
+            counts = Counter()
+            for testcase in testcases:
+                if testcase in emulated:
+                    result = emulated[testcase].result()
+                else:
+                    result = CaseResult(statuses[testcase])
+                counts[result.status] += 1
+                self.results_store.add(
+                    run_id, testcase.src_path, result.status, result.note,
+                    dict(result.stages, compile=compile_times.get(testcase)),
+                    result.returncode, result.output_size
+                )
+                log_file.write(self.log_line(testcase, result.status, result.note))
+            # Statistical conclusion, w/o transmitting.
+            stat_conclu = stat_line(counts, len(testcases), [
+                (abbr, status) for abbr, status in STATUS_ABBRS if status != 'Transmit Fail'
+            ])
             stat_file.write(stat_conclu)
             if terminal_log:
                 print(stat_conclu, end='')
-            self.sftp.shutdown()
+            self.results_store.end_run(run_id, stat_conclu)
+            if self.build_cache is not None:
+                stat_file.write(self.build_cache.stat_line())
+                if terminal_log:
+                    print(self.build_cache.stat_line(), end='')
+            self.report_compile(testcases, compile_times, stat_file, terminal_log)
+            if self.artifacts is not None:
+                self.archive(stat_file, terminal_log)
 
-    
-    def gen_asm(self, testcase:TestCase) -> str:
-        # Compile the .sy file with our compiler.
-        s_path = f"{self.asm_dir}/{testcase.s_name}"
-        cmd_compile = (
-            f"{self.java_path}"
-            f" -jar {self.compiler_path}"
-            f" -s {testcase.sy_path}"
-            f" -o {s_path}"
+    def compile_all(self,
+        testcases:Iterable[TestCase], statuses:Dict[TestCase, str],
+        ship:Callable[[Iterator[TestCase]], None], progress:Progress, terminal_log=True,
+        jobs:int=1, queue_size:int=8
+    ) -> Dict[TestCase, float]:
+        """Compile testcases, shipping the compiled ones as they come.
+
+        Compiled testcases are put into a bounded queue, which is drained by ship in
+        another thread, so compiling and shipping overlap. Compiling is held back
+        while queue_size testcases are waiting.
+
+        Args:
+            testcases: TestCases to be compiled, compiled as they are found.
+            statuses: A dict to record the status of testcases failing to compile.
+            ship: A function consuming the iterator of testcases compiled.
+            progress: The Progress of the run, which the testcases enter as they are
+                    compiled. Those failing to compile are finished here, and the rest
+                    are left for ship.
+            jobs: Number of testcases to compile concurrently.
+            queue_size: Number of compiled testcases allowed to wait for shipping.
+
+        Returns:
+            A dict mapping the testcases to the seconds spent compiling them (unless
+            served by the build cache).
+        """
+        compiled = queue.Queue(maxsize=queue_size)
+        compile_times = {}
+
+        def enqueue(ctx:CaseContext) -> bool:
+            # Blocks while the shipping lags behind.
+            compiled.put(ctx.testcase)
+            # Not timed, as it's waiting rather than working.
+            return False
+
+        # The cross-compiling route: compile -> ship (then test on the Raspberry Pi).
+        pipeline = Pipeline(
+            self.pipeline.stages + [Stage('ship', enqueue)], self.pipeline.status,
+            self.pipeline.on_failure
+        )
+
+        def compile_case(testcase:TestCase) -> None:
+            progress.start(testcase)
+            result = pipeline.run(testcase, on_stage=progress.stage)
+            if 'compile' in result.stages:
+                compile_times[testcase] = result.stages['compile']
+            if result.status != COMPILED:
+                statuses[testcase] = result.status
+                progress.finish(
+                    testcase, result.status,
+                    self.log_line(testcase, result.status, result.note) if terminal_log else ''
+                )
+
+        def drain() -> None:
+            items = iter(compiled.get, None)
+            try:
+                ship(items)
+            finally:
+                # Unblock the compiling if shipping fails midway.
+                for _ in items:
+                    pass
+
+        shipper = threading.Thread(target=drain)
+        shipper.start()
+        try:
+            # Compile each test case.
+            if jobs > 1:
+                with ThreadPoolExecutor(max_workers=jobs) as executor:
+                    list(executor.map(compile_case, testcases))
+            else:
+                for testcase in testcases:
+                    compile_case(testcase)
+        finally:
+            compiled.put(None)
+            shipper.join()
+        return compile_times
+
+    def progress(self,
+        testcases:Iterable[TestCase], abbrs:List, terminal_log:bool
+    ) -> Progress:
+        """Make the Progress of a run, of which the total is known unless the
+        testcases are consumed as they are found (e.g. from a Loader).
+        """
+        return Progress(
+            len(testcases) if isinstance(testcases, Sized) else None, abbrs,
+            self.max_path_width, live=None if terminal_log else False
         )
-        subprocess.run(
-            cmd_compile.split(),
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL
+
+    def log_line(self, testcase:TestCase, status:str, note:str='') -> str:
+        """Format the line of the result of a testcase in result.log.
+        """
+        return (
+            str(testcase.src_path).ljust(self.max_path_width, ' ')
+            + f' \t{status}'
+            + (f' ({note})\n' if note else '\n')
         )
-        # If the compiler didn't successfully generate an .ll file.
-        if not os.path.exists(s_path):
+
+    def discover(self, testcases:Iterable[TestCase], found:List[TestCase]) -> Iterator[TestCase]:
+        """Pass testcases through as they are found, collecting them in order into found
+        and widening the logging format to fit them.
+
+        Raises:
+            ValueError: If two testcases are named the same (see unique_names).
+        """
+        for testcase in unique_names(testcases):
+            found.append(testcase)
+            self.max_path_width = max(self.max_path_width, len(str(testcase.src_path)))
+            yield testcase
+
+    def compiler_hash(self) -> Optional[str]:
+        """Get the SHA-256 hex digest of the compiler jar, or None if not found.
+        """
+        if not self.compiler_path.exists():
             return None
-        
+        return hashlib.sha256(self.compiler_path.read_bytes()).hexdigest()
+
+    def keep_failed(self, ctx:CaseContext, result:CaseResult) -> None:
+        """Collect a failed testcase (with the assembly and the output if any) to the
+        CE- or WA-directory, and record it in failures.jsonl.
+        """
+        s_path = self.asm_dir/ctx.testcase.s_name
+        if ctx.failed_stage in ('compile', 'link'):
+            p, files = ctx.testcase.collect(self.compilerr_dir, [s_path])
+        else:
+            out_path = self.out_dir/ctx.testcase.gen_out_name
+            p, files = ctx.testcase.collect(self.wrongans_dir, [out_path, s_path])
+        self.failures.add(
+            ctx.testcase, result.status, result.note, ctx.failed_stage, p, files
+        )
+
+    def compile_asm(self, ctx:CaseContext) -> Optional[bool]:
+        """The compile stage: compile the .sy file to assembly with our compiler,
+        unless the assembly is served by the build cache.
+
+        Raises:
+            StageFailed: If the compiler fails, or runs out of its time limit.
+        """
+        testcase = ctx.testcase
+        s_path = f"{self.asm_dir}/{testcase.s_name}"
         o_path = f"{self.asm_dir}/{testcase.o_name}"
+        ctx.artifacts['s'] = Path(s_path)
+        # Reuse the assembly generated from identical inputs if cached.
+        if self.build_cache is not None:
+            ctx.cache_key = self.build_cache.key(
+                testcase.src_path, self.compiler_path, flags='-s'
+            )
+            if self.build_cache.fetch(ctx.cache_key, {'asm.s': s_path}):
+                return False
+
+        # Compile the .sy file with our compiler.
+        args_compile = f"-s {testcase.src_path} -o {s_path}".split()
+        try:
+            served = self.compiler_daemon is not None and self.compiler_daemon.compile(
+                args_compile, s_path, self.limits.compile_timeout
+            ) is not None
+        except subprocess.TimeoutExpired:
+            raise StageTimeout('compile', self.limits.compile_timeout)
+        if not served:
+            cmd_compile = f"{self.java_path} {self.jvm_options} -jar {self.compiler_path}".split()
+            run_stage(cmd_compile + args_compile, 'compile', self.limits.compile_timeout)
+        # If the compiler didn't successfully generate an .s file.
+        if not os.path.exists(s_path):
+            raise StageFailed(COMPILATION_ERROR)
+        if self.build_cache is not None:
+            self.build_cache.store(ctx.cache_key, {'asm.s': s_path})
+        
         # cmd_link = f"arm-none-eabi-gcc {s_path} -L . -lsysy -o {o_path} -mcpu=cortex-a7 -mfloat-abi=hard"
         # subprocess.run(
         #     cmd_link.split(),
@@ -133,13 +741,67 @@ class BackendAutoTester:
         # )
         # # If the llvm-linker didn't successfully generate a .bc file.
         # if not os.path.exists(o_path):
-        #     return None
+        #     raise StageFailed(COMPILATION_ERROR)
+
+    def cross_link(self, ctx:CaseContext) -> None:
+        """The link stage of the emulated route: assemble and link the assembly with
+        the runtime built by the cross toolchain.
+
+        Raises:
+            StageFailed: If assembling or linking fails, or runs out of its time limit.
+        """
+        toolchain = ctx.options['toolchain']
+        s_path = self.asm_dir/ctx.testcase.s_name
+        exe_path = self.asm_dir/ctx.testcase.exe_name
+        cmd_link = (
+            f"{toolchain.cc} {toolchain.cflags}"
+            f" {s_path}"
+            f" {ctx.options['runtime']}"
+            f" -o {exe_path}"
+        )
+        run_stage(cmd_link.split(), 'link', self.limits.link_timeout)
+        # If the linker didn't successfully generate an executable.
+        if not os.path.exists(exe_path):
+            raise StageFailed(COMPILATION_ERROR)
+        ctx.artifacts['exe'] = exe_path
 
-        return o_path
+    def exec_emulated(self, ctx:CaseContext) -> None:
+        """The exec stage of the emulated route: run the executable under the emulator,
+        matching the output as it comes.
+
+        Raises:
+            StageFailed: If the program fails to even start.
+        """
+        testcase = ctx.testcase
+        out_path = self.out_dir/testcase.gen_out_name
+        ctx.artifacts['out'] = out_path
+        cmd_run = f"{ctx.options['toolchain'].qemu} {ctx.artifacts['exe']}"
+        try:
+            ctx.run = run_and_match(
+                cmd_run.split(), out_path, testcase.std_out_path, testcase.in_path,
+                ctx.options['echo_ret'], timeout=self.limits.exec_timeout,
+                on_start=self.limits.rlimits()
+            )
+        except OSError as e:
+            raise self.limits.start_failure(e)
+        ctx.stages['exec'] = ctx.run.wall_time
+
+    def match_output(self, ctx:CaseContext) -> None:
+        """The match stage: judge the execution by the limits and the standard output.
+
+        Raises:
+            StageFailed: If the program ended abnormally or answered wrong.
+        """
+        self.limits.check(ctx.run)
 
     def trans_asm(
         self, testcase:TestCase
-    ):
+    ) -> Future:
+        """Upload the assembly file of a testcase to the Raspberry Pi in the background.
+
+        Returns:
+            A Future of the bool indicating if the file is uploaded.
+        """
         replace = False
-        return self.sftp.upload(f"{self.asm_dir}/{testcase.s_name}", self.dst, replace)
-        # self.sftp.upload(f"{self.asm_dir}/{testcase.o_name}", self.dst, replace)
\ No newline at end of file
+        return self.sftp.submit(f"{self.asm_dir}/{testcase.s_name}", self.dst, replace)
+        # self.sftp.submit(f"{self.asm_dir}/{testcase.o_name}", self.dst, replace)
@@ -0,0 +1,298 @@
+import subprocess
+import tempfile
+import threading
+import zipfile
+from pathlib import Path
+from queue import Queue
+from typing import List, Optional
+
+
+# Source of the driver running inside the long-lived JVM. It is launched in
+# source-file mode (`java Driver.java`, JDK 11+), so no separate build step is
+# needed. The compiler jar is not on the classpath but loaded by a class loader of
+# its own for each request, so that static fields of the compiler start afresh.
+#
+# Protocol (line based, over the stdin/stdout of the JVM):
+#   daemon  -> tester: "READY"                          once, when warmed up
+#   tester  -> daemon: "<output path>\t<argc>"          followed by argc lines,
+#                                                       one argument per line
+#   daemon  -> tester: "<exit status>\t<output path>"   after each compilation
+DRIVER_SOURCE = r'''
+import java.io.*;
+import java.lang.reflect.InvocationTargetException;
+import java.lang.reflect.Method;
+import java.net.URL;
+import java.net.URLClassLoader;
+import java.security.Permission;
+
+public class CbiasDaemon {
+    static class ExitTrap extends SecurityException {
+        final int status;
+        ExitTrap(int status) { this.status = status; }
+    }
+
+    public static void main(String[] args) throws Exception {
+        String mainClass = args[0];
+        URL[] jar = { new File(args[1]).toURI().toURL() };
+        // Turn System.exit() of the compiler into an exception carrying the status.
+        try {
+            System.setSecurityManager(new SecurityManager() {
+                @Override public void checkExit(int status) { throw new ExitTrap(status); }
+                @Override public void checkPermission(Permission perm) {}
+                @Override public void checkPermission(Permission perm, Object context) {}
+            });
+        } catch (UnsupportedOperationException e) {
+            // A System.exit() from the compiler then ends the daemon,
+            // and the tester falls back to one JVM per testcase.
+        }
+
+        BufferedReader in = new BufferedReader(new InputStreamReader(System.in));
+        PrintStream out = System.out;
+        PrintStream err = System.err;
+        PrintStream sink = new PrintStream(OutputStream.nullOutputStream());
+        out.println("READY");
+        out.flush();
+
+        String header;
+        while ((header = in.readLine()) != null) {
+            String[] fields = header.split("\t");
+            String[] compilerArgs = new String[Integer.parseInt(fields[1])];
+            for (int i = 0; i < compilerArgs.length; i++) {
+                compilerArgs[i] = in.readLine();
+            }
+            int status = 0;
+            System.setOut(sink);
+            System.setErr(sink);
+            try (URLClassLoader loader =
+                    new URLClassLoader(jar, ClassLoader.getPlatformClassLoader())) {
+                Method entry = Class.forName(mainClass, true, loader)
+                    .getMethod("main", String[].class);
+                entry.invoke(null, (Object) compilerArgs);
+            } catch (InvocationTargetException e) {
+                Throwable cause = e.getCause();
+                status = cause instanceof ExitTrap ? ((ExitTrap) cause).status : 1;
+            } catch (Throwable e) {
+                status = 1;
+            } finally {
+                System.setOut(out);
+                System.setErr(err);
+            }
+            out.println(status + "\t" + fields[0]);
+            out.flush();
+        }
+    }
+}
+'''
+
+
+class CompilerDaemon:
+    """A pool of long-lived JVMs serving compile requests for the compiler jar.
+
+    Launching `java -jar` for every testcase pays for JVM boot, class loading and
+    JIT warmup each time. A CompilerDaemon keeps warm JVMs running a small driver
+    (see DRIVER_SOURCE), which invokes the main class of the compiler jar in-process
+    for each request. Each JVM serves one request at a time, so start as many
+    workers as testcases compiled concurrently.
+
+    The compiler is loaded by a fresh class loader for each request, so that no
+    state in its static fields carries over to the next testcase. Only the JVM and
+    the JDK classes stay warm; the classes of the compiler are loaded anew each time.
+
+    Attributes:
+        java_path: A Path to the java launcher (under JDK/bin/).
+        compiler_path: A Path to the compiler (.jar).
+        workers: A list of Popen of all the JVMs started.
+    """
+
+    def __init__(self, compiler_path:str, java_path:str, jvm_options:str='') -> None:
+        """Initialize a CompilerDaemon. No JVM is started until start() is called.
+
+        Args:
+            jvm_options: A string of the options to launch the JVMs with, e.g.
+                    '-XX:TieredStopAtLevel=1'.
+        """
+        self.java_path = Path(java_path)
+        self.compiler_path = Path(compiler_path)
+        self.jvm_options = jvm_options
+        self.workers = []
+        # Idle JVMs. Dead ones are put back as well, so that waiting
+        # threads notice the breakdown instead of blocking forever.
+        self._idle = Queue()
+        self._lock = threading.Lock()
+        self._driver_dir = None
+
+    def start(self, workers:int=1) -> bool:
+        """Start JVMs until there are as many as the given number of workers.
+
+        Returns:
+            True if there is at least one JVM ready to serve. Otherwise, return False.
+        """
+        with self._lock:
+            main_class = self.main_class()
+            if main_class is None:
+                return False
+            if self._driver_dir is None:
+                self._driver_dir = tempfile.TemporaryDirectory(prefix='cbias-daemon-')
+                with open(Path(self._driver_dir.name)/'CbiasDaemon.java', 'w') as f:
+                    f.write(DRIVER_SOURCE)
+            # Launch all the JVMs first, so that they warm up at the same time.
+            launched = [
+                self._launch(main_class) for _ in range(workers - len(self.workers))
+            ]
+            for proc in launched:
+                if proc is not None and self._handshake(proc):
+                    self.workers.append(proc)
+                    self._idle.put(proc)
+            return self.available()
+
+    def available(self) -> bool:
+        """Check if any JVM started is still alive.
+        """
+        return any(proc.poll() is None for proc in self.workers)
+
+    def main_class(self) -> Optional[str]:
+        """Read the name of the main class from the manifest of the compiler jar.
+        """
+        try:
+            with zipfile.ZipFile(self.compiler_path) as jar:
+                manifest = jar.read('META-INF/MANIFEST.MF').decode()
+        except (OSError, KeyError, zipfile.BadZipFile):
+            return None
+        for line in manifest.splitlines():
+            if line.startswith('Main-Class:'):
+                return line.split(':', 1)[1].strip()
+        return None
+
+    def _launch(self, main_class:str) -> Optional[subprocess.Popen]:
+        """Launch a JVM running the driver.
+        """
+        cmd = (
+            f"{self.java_path} {self.jvm_options}"
+            f" -Djava.security.manager=allow"
+        ).split() + [
+            str(Path(self._driver_dir.name)/'CbiasDaemon.java'),
+            main_class, str(self.compiler_path.resolve())
+        ]
+        try:
+            return subprocess.Popen(
+                cmd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+                bufsize=1
+            )
+        except OSError:
+            return None
+
+    def _handshake(self, proc:subprocess.Popen) -> bool:
+        """Wait for a JVM launched to be ready for requests.
+        """
+        if proc.stdout.readline().strip() != 'READY':
+            proc.kill()
+            proc.wait()
+            return False
+        return True
+
+    def compile(self, 
+        args:List[str], out_path:str, timeout:Optional[float]=None
+    ) -> Optional[int]:
+        """Compile in one of the warm JVMs with the given compiler arguments.
+
+        Args:
+            args: A list of string of command line arguments to the compiler.
+            out_path: A string of the path to the file the compiler is to generate.
+            timeout: [Optional] Wall-clock seconds allowed for the compilation.
+
+        Returns:
+            The exit status of the compiler. If no JVM is able to serve the request,
+            return None, and the caller should fall back to launching the compiler
+            with a fresh JVM.
+
+        Raises:
+            subprocess.TimeoutExpired: If the compilation runs out of the timeout. The
+                    JVM stuck is killed, and a new one takes its place.
+        """
+        if not self.workers:
+            return None
+        proc = self._idle.get()
+        # The timer kills the JVM only if no reply has come yet, decided under the lock.
+        decided = threading.Lock()
+        state = {'replied': False, 'timed_out': False}
+        def kill_on_timeout():
+            with decided:
+                if state['replied']:
+                    return
+                state['timed_out'] = True
+            proc.kill()
+        timer = threading.Timer(timeout, kill_on_timeout) if timeout is not None else None
+        try:
+            # Replace the JVM died in a previous request.
+            if proc.poll() is not None:
+                proc = self._respawn(proc)
+                if proc.poll() is not None:
+                    return None
+            proc.stdin.write(f"{out_path}\t{len(args)}\n")
+            for arg in args:
+                proc.stdin.write(f"{arg}\n")
+            proc.stdin.flush()
+            if timer is not None:
+                timer.start()
+            reply = proc.stdout.readline().rstrip('\n').split('\t')
+            with decided:
+                state['replied'] = True
+                timed_out = state['timed_out']
+            if timer is not None:
+                timer.cancel()
+            replied = len(reply) == 2 and reply[1] == str(out_path)
+            if timed_out:
+                proc.wait()
+                proc = self._respawn(proc)
+                # Killed only after the reply, which still counts.
+                if not replied:
+                    raise subprocess.TimeoutExpired(args, timeout)
+            elif not replied:
+                # The JVM died halfway, e.g. System.exit() could not be trapped.
+                proc.kill()
+                proc.wait()
+                return None
+            return int(reply[0])
+        except (OSError, ValueError):
+            proc.kill()
+            proc.wait()
+            return None
+        finally:
+            self._idle.put(proc)
+
+    def _respawn(self, dead:subprocess.Popen) -> subprocess.Popen:
+        """Launch a JVM to take the place of a dead one.
+
+        Returns:
+            The Popen of the new JVM, or the dead one if failing to launch.
+        """
+        with self._lock:
+            main_class = self.main_class()
+            proc = self._launch(main_class) if main_class is not None else None
+            if proc is None or not self._handshake(proc):
+                return dead
+            self.workers[self.workers.index(dead)] = proc
+            return proc
+
+    def shutdown(self) -> None:
+        """Stop all the JVMs started.
+        """
+        with self._lock:
+            for proc in self.workers:
+                if proc.poll() is None:
+                    try:
+                        # The driver exits on the end of its input.
+                        proc.stdin.close()
+                        proc.wait(timeout=5)
+                    except (OSError, subprocess.TimeoutExpired):
+                        proc.kill()
+                        proc.wait()
+            self.workers = []
+            self._idle = Queue()
+            if self._driver_dir is not None:
+                self._driver_dir.cleanup()
+                self._driver_dir = None
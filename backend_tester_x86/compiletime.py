@@ -0,0 +1,67 @@
+import csv
+import math
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+
+class CompileReport:
+    """CompileReport collects the seconds spent compiling each testcase in a run, so
+    that the sources making the compiler slow stand out, and a tuning of the JVM (see
+    jvm_options of the testers) can be compared across runs.
+
+    Testcases served by the build cache are not compiled, hence not counted.
+
+    Attributes:
+        jvm_options: A string of the JVM options the testcases are compiled with.
+        warm: Bool indicating if the testcases are compiled by warm JVMs.
+        times: A list of (path, seconds) of the testcases compiled, in order.
+    """
+
+    def __init__(self, jvm_options:str='', warm:bool=False) -> None:
+        self.jvm_options = jvm_options
+        self.warm = warm
+        self.times = []
+
+    def add(self, path:str, seconds:float) -> None:
+        self.times.append((path, seconds))
+
+    def percentile(self, q:float) -> Optional[float]:
+        """Get the q-th percentile (by the nearest rank) of the seconds compiling, or
+        None if nothing is compiled.
+        """
+        if not self.times:
+            return None
+        seconds = sorted(s for _, s in self.times)
+        return seconds[max(math.ceil(q / 100 * len(seconds)) - 1, 0)]
+
+    def slowest(self, n:int) -> List[Tuple[str, float]]:
+        """Get the n testcases slowest to compile, the slowest first.
+        """
+        return sorted(self.times, key=lambda item: item[1], reverse=True)[:n]
+
+    def write(self, dest_dir:str) -> None:
+        """Write the seconds compiling each testcase as compile.csv under the given
+        directory, the slowest first.
+        """
+        with open(Path(dest_dir)/'compile.csv', 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['testcase', 'compile_s', 'jvm_options', 'warm'])
+            for path, seconds in self.slowest(len(self.times)):
+                writer.writerow([path, f'{seconds:.6f}', self.jvm_options, int(self.warm)])
+
+    def stat_line(self, n:int=5) -> str:
+        """Get a line summarizing the seconds compiling, with the n slowest testcases.
+        """
+        line = f'Compile: {len(self.times)} compiled'
+        if self.jvm_options or self.warm:
+            line += ' (' + ', '.join(filter(None, [
+                'warm JVMs' if self.warm else '',
+                f'JVM options: {self.jvm_options}' if self.jvm_options else '',
+            ])) + ')'
+        if self.times:
+            line += (
+                f', p50 {self.percentile(50):.3f}s, p95 {self.percentile(95):.3f}s,'
+                f' max {self.percentile(100):.3f}s; slowest: '
+                + ', '.join(f'{path} {seconds:.3f}s' for path, seconds in self.slowest(n))
+            )
+        return line + '\n'
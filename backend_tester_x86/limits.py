@@ -0,0 +1,163 @@
+import errno
+import signal
+import subprocess
+from typing import Callable, List, Optional
+
+from pipeline import COMPILATION_ERROR, StageFailed, WRONG_ANSWER
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, where no rlimit is applied.
+    resource = None
+
+# Not defined on Windows.
+SIGXCPU = getattr(signal, 'SIGXCPU', None)
+SIGKILL = getattr(signal, 'SIGKILL', None)
+
+
+TIME_LIMIT_EXCEEDED = 'Time Limit Exceeded'
+MEMORY_LIMIT_EXCEEDED = 'Memory Limit Exceeded'
+RUNTIME_ERROR = 'Runtime Error'
+
+# Hints in stderr of a program failing to allocate memory.
+_OOM_HINTS = (
+    'out of memory', 'cannot allocate memory', 'bad_alloc', 'failed to map segment'
+)
+
+
+class StageTimeout(StageFailed):
+    """Raised when a stage of testing (e.g. compiling) runs out of its time limit.
+
+    Attributes:
+        stage: A string of the name of the stage.
+        timeout: The time limit of the stage in seconds.
+    """
+
+    def __init__(self, stage:str, timeout:float) -> None:
+        super().__init__(TIME_LIMIT_EXCEEDED, f'{stage} timed out after {timeout:g}s')
+        self.stage = stage
+        self.timeout = timeout
+
+
+class Limits:
+    """Limits on the stages of testing a testcase, so that a runaway program (or a
+    compiler stuck on it) can't hang the whole batch.
+
+    A limit of None means unlimited.
+
+    Attributes:
+        compile_timeout: Wall-clock seconds allowed for the compiler.
+        link_timeout: Wall-clock seconds allowed for linking.
+        exec_timeout: Wall-clock seconds allowed for executing the compiled program.
+        memory: Bytes of address space allowed for the program executed (RLIMIT_AS).
+                Applied on Linux only (see rlimits).
+        cpu: CPU seconds allowed for the program executed (RLIMIT_CPU). Applied on
+                Linux only.
+    """
+
+    def __init__(self,
+        compile_timeout:Optional[float]=None, link_timeout:Optional[float]=None,
+        exec_timeout:Optional[float]=None, memory:Optional[int]=None,
+        cpu:Optional[int]=None
+    ) -> None:
+        self.compile_timeout = compile_timeout
+        self.link_timeout = link_timeout
+        self.exec_timeout = exec_timeout
+        self.memory = memory
+        self.cpu = cpu
+
+    def rlimits(self) -> Optional[Callable[[int], None]]:
+        """Get the function applying the rlimits to a program just started, given its
+        pid, or None if there are no rlimits to apply (or no prlimit to apply them).
+
+        The rlimits are set by the parent with prlimit() rather than in the child
+        before exec (preexec_fn), which is not safe with the worker threads running.
+        """
+        if not hasattr(resource, 'prlimit') or (self.memory is None and self.cpu is None):
+            return None
+        memory, cpu = self.memory, self.cpu
+
+        def apply_rlimits(pid:int) -> None:
+            try:
+                if memory is not None:
+                    resource.prlimit(pid, resource.RLIMIT_AS, (memory, memory))
+                if cpu is not None:
+                    # SIGXCPU at the soft limit, SIGKILL at the hard one.
+                    resource.prlimit(pid, resource.RLIMIT_CPU, (cpu, cpu + 1))
+            except ProcessLookupError:
+                # Ended already.
+                pass
+        return apply_rlimits
+
+    def abnormal_status(self,
+        returncode:int, timed_out:bool, max_rss:Optional[int], stderr:str
+    ) -> Optional[str]:
+        """Classify an execution ending abnormally.
+
+        Args:
+            returncode: The return code of the program (negative if killed by a signal).
+            timed_out: Bool indicating if the program was killed for exec_timeout.
+            max_rss: Peak resident set size of the program in KiB, or None if unknown.
+            stderr: A string of (the tail of) stderr of the program.
+
+        Returns:
+            A string of the status, or None if the program ended normally.
+        """
+        if timed_out or (SIGXCPU is not None and returncode == -SIGXCPU) \
+            or (self.cpu is not None and SIGKILL is not None and returncode == -SIGKILL):
+            return TIME_LIMIT_EXCEEDED
+        if self.memory is not None and returncode != 0 and (
+            (max_rss is not None and max_rss * 1024 >= self.memory)
+            or any(hint in stderr.lower() for hint in _OOM_HINTS)
+        ):
+            return MEMORY_LIMIT_EXCEEDED
+        if returncode < 0:
+            return RUNTIME_ERROR
+        return None
+
+    def check(self, run:'RunResult') -> None:
+        """Check an execution (see matcher.RunResult) against the limits and the
+        standard output.
+
+        Raises:
+            StageFailed: With the status if the program ended abnormally or answered
+                    wrong.
+        """
+        status = self.abnormal_status(run.returncode, run.timed_out, run.max_rss, run.stderr)
+        if status is not None:
+            raise StageFailed(status, f'returned {run.returncode} after {run.wall_time:.2f}s')
+        if run.mismatch is not None:
+            raise StageFailed(WRONG_ANSWER, f'first differs at {run.mismatch}')
+
+    def start_failure(self, e:OSError) -> StageFailed:
+        """Classify a program failing to even start, e.g. out of the memory limit
+        when loading.
+        """
+        if e.errno == errno.ENOMEM and self.memory is not None:
+            return StageFailed(MEMORY_LIMIT_EXCEEDED, str(e))
+        return StageFailed(RUNTIME_ERROR, str(e))
+
+
+def run_stage(
+    cmd:List[str], stage:str, timeout:Optional[float]=None
+) -> subprocess.CompletedProcess:
+    """Run a command of a stage (e.g. compiling or linking) within its time limit,
+    discarding its output.
+
+    Raises:
+        StageTimeout: If the command runs out of the time limit (and is killed).
+        StageFailed: As a Compilation Error, if the command fails to even start, e.g.
+                the tool is not installed.
+    """
+    try:
+        return subprocess.run(
+            cmd,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            timeout=timeout
+        )
+    except subprocess.TimeoutExpired:
+        raise StageTimeout(stage, timeout)
+    except OSError as e:
+        raise StageFailed(COMPILATION_ERROR, f'{stage} failed to start: {e}')
@@ -1,6 +1,6 @@
 from yaml import load
 from backend_tester import BackendAutoTester 
-from caseloader import Loader, TestCase
+from caseloader import Loader, Scheme, TestCase
 
 COMPILER = "./cbias.jar"
 JAVA = "C:/Program Files/Java/jdk-17.0.1/bin/java"
@@ -9,27 +9,32 @@ sftpArg = {'ip':'192.168.43.195','user':'pi','password':'raspberry','port':22}
 
 scheme_function2022 = {
     "path" : "testcases/functional2022",
-    "echo" : True
+    "echo" : True,
+    # Options of the JVMs compiling, e.g. "-XX:TieredStopAtLevel=1".
+    "jvm" : ""
 }
 
 scheme_performance2022 = {
     "path" : "testcases\performance",
-    "echo" : True
+    "echo" : True,
+    "jvm" : ""
 }
 
 scheme_temp = {
     "path" : "testcases/tmp",
-    "echo" : True
+    "echo" : True,
+    "jvm" : ""
 }
 
 
 if __name__ == '__main__':
-    tester = BackendAutoTester(COMPILER, JAVA, OUT_DIR, sftpArg)
-
     # schemes = [scheme_function2022]
     schemes = [scheme_performance2022]
     # schemes = [scheme_temp]
 
-    for scheme in schemes:
-        loader = Loader(scheme.get("path"))
-        tester.run(loader.testcases, echo_ret=scheme.get("echo"))
+    # One JVM configuration for the whole batch, compiling with the same JVMs.
+    tester = BackendAutoTester(COMPILER, JAVA, OUT_DIR, sftpArg, jvm_options=schemes[0].get("jvm", ""))
+
+    # One batch over the same connection, with a stat line for each scheme.
+    tester.run_schemes([Scheme.from_dict(scheme) for scheme in schemes])
+    tester.shutdown()
@@ -0,0 +1,239 @@
+import os
+import posixpath
+import shutil
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from queue import Queue
+from typing import Callable, Dict, List, Optional
+
+
+class SFTPBackend:
+    """A remote file system reached over one SFTP channel.
+    """
+
+    def __init__(self, client) -> None:
+        # A paramiko.SFTPClient.
+        self.client = client
+
+    def listdir(self, remote_dir:str) -> List[str]:
+        return self.client.listdir(remote_dir)
+
+    def mkdir(self, remote_dir:str) -> None:
+        self.client.mkdir(remote_dir)
+
+    def put(self, local_path:str, remote_path:str) -> None:
+        self.client.put(local_path, remote_path)
+
+    def close(self) -> None:
+        self.client.close()
+
+
+class LocalBackend:
+    """A stand-in for the remote file system, rooted at a local directory.
+
+    Remote paths are mapped under the root (e.g. /home/pi/test to <root>/home/pi/test),
+    so that uploading can be tested offline.
+    """
+
+    def __init__(self, root:str) -> None:
+        self.root = Path(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def _local(self, remote_path:str) -> Path:
+        return self.root/remote_path.lstrip('/')
+
+    def listdir(self, remote_dir:str) -> List[str]:
+        return os.listdir(self._local(remote_dir))
+
+    def mkdir(self, remote_dir:str) -> None:
+        os.mkdir(self._local(remote_dir))
+
+    def put(self, local_path:str, remote_path:str) -> None:
+        shutil.copyfile(local_path, self._local(remote_path))
+
+    def close(self) -> None:
+        pass
+
+
+class BatchUploader:
+    """BatchUploader pushes files to a remote directory over a pool of channels.
+
+    Unlike MainWindow (see mySftp.py), which walks the remote path from '/' and lists
+    the remote directory for every single file, a BatchUploader creates each remote
+    directory once, lists it once, and remembers what is there afterwards. Files are
+    put concurrently over several channels, hiding the round-trip latency.
+
+    Attributes:
+        channels: Number of channels files are put over concurrently.
+    """
+
+    def __init__(self,
+        connect:Callable[[], object], channels:int=4,
+        on_close:Optional[Callable[[], None]]=None
+    ) -> None:
+        """Initialize a BatchUploader.
+
+        Args:
+            connect: A function opening a new channel (SFTPBackend or LocalBackend).
+            channels: Number of channels to open.
+            on_close: [Optional] A function called after all channels are closed,
+                    e.g. closing the underlying connection.
+        """
+        self.channels = channels
+        self._backends = [connect() for _ in range(channels)]
+        self._idle = Queue()
+        for backend in self._backends:
+            self._idle.put(backend)
+        self._executor = ThreadPoolExecutor(max_workers=channels)
+        # Puts in flight, bounded to the channels so that callers can't run ahead.
+        self._slots = threading.BoundedSemaphore(channels)
+        self._on_close = on_close
+        self._lock = threading.Lock()
+        # Remote directories known to exist.
+        self._made = {'/', ''}
+        # Names listed (or put since) in each remote directory.
+        self._listing = {}
+
+    @classmethod
+    def from_args(cls, arg:Dict, channels:int=4) -> 'BatchUploader':
+        """Create a BatchUploader from the same argument as MainWindow takes:
+        {'ip': ..., 'user': ..., 'password': ..., 'port': 22}.
+
+        With {'local': <dir>} instead, files are "uploaded" to a LocalBackend rooted
+        at the given directory.
+        """
+        if 'local' in arg:
+            return cls(lambda: LocalBackend(arg['local']), channels)
+
+        import paramiko
+        transport = paramiko.Transport((arg['ip'], arg['port']))
+        transport.connect(username=arg['user'], password=arg['password'])
+        # All channels are multiplexed over one SSH connection.
+        return cls(
+            lambda: SFTPBackend(paramiko.SFTPClient.from_transport(transport)),
+            channels, on_close=transport.close
+        )
+
+    def _with_backend(self, fn:Callable):
+        backend = self._idle.get()
+        try:
+            return fn(backend)
+        finally:
+            self._idle.put(backend)
+
+    def make_dirs(self, remote_dir:str) -> None:
+        """Create a remote directory and its parents if not known to exist.
+        """
+        remote_dir = posixpath.normpath(remote_dir)
+        with self._lock:
+            if remote_dir in self._made:
+                return
+        self.make_dirs(posixpath.dirname(remote_dir))
+        try:
+            self._with_backend(lambda backend: backend.mkdir(remote_dir))
+        except OSError:
+            # Existing already.
+            pass
+        with self._lock:
+            self._made.add(remote_dir)
+
+    def _listed(self, remote_dir:str) -> set:
+        with self._lock:
+            names = self._listing.get(remote_dir)
+        if names is None:
+            names = set(self._with_backend(lambda backend: backend.listdir(remote_dir)))
+            with self._lock:
+                names = self._listing.setdefault(remote_dir, names)
+        return names
+
+    def _prepare(self, remote_dir:str):
+        """Make sure a remote directory exists and is listed.
+
+        Returns:
+            A tuple of the normalized path to the directory and the set of names in it.
+        """
+        remote_dir = posixpath.normpath(remote_dir.replace('\\', '/'))
+        self.make_dirs(remote_dir)
+        return remote_dir, self._listed(remote_dir)
+
+    def _schedule(self,
+        local_path:str, remote_dir:str, names:set, replace:bool
+    ) -> Future:
+        name = os.path.basename(local_path)
+        if not os.path.isfile(local_path):
+            print(f'Source not found: {local_path}')
+            return _done(False)
+        if not replace and name in names:
+            print(f'[*] Skipped existing: {local_path} -> {remote_dir}/{name}')
+            return _done(True)
+        self._slots.acquire()
+        future = self._executor.submit(
+            self._put, local_path, posixpath.join(remote_dir, name), names
+        )
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def upload_batch(self,
+        local_paths:List[str], remote_dir:str, replace:bool=False
+    ) -> List[bool]:
+        """Upload files into a remote directory concurrently.
+
+        Args:
+            local_paths: A list of strings of paths to the local files.
+            remote_dir: A string of the path to the remote directory, created if not
+                    existing.
+            replace: Bool indicating if to replace the files existing remotely.
+                    Otherwise, such files are skipped (and regarded as uploaded).
+
+        Returns:
+            A list of bools indicating if each of the files is uploaded.
+        """
+        remote_dir, names = self._prepare(remote_dir)
+        futures = [
+            self._schedule(local_path, remote_dir, names, replace)
+            for local_path in local_paths
+        ]
+        return [f.result() for f in futures]
+
+    def upload(self, local_path:str, remote_dir:str, replace:bool=False) -> bool:
+        """Upload a file into a remote directory.
+        """
+        return self.upload_batch([local_path], remote_dir, replace)[0]
+
+    def submit(self, local_path:str, remote_dir:str, replace:bool=False) -> Future:
+        """Upload a file into a remote directory in the background.
+
+        Blocks while all the channels are busy, so that the caller (e.g. a producer of
+        the files) is held back rather than piling up files to upload.
+
+        Returns:
+            A Future of the bool indicating if the file is uploaded.
+        """
+        remote_dir, names = self._prepare(remote_dir)
+        return self._schedule(local_path, remote_dir, names, replace)
+
+    def _put(self, local_path:str, remote_path:str, names:set) -> bool:
+        try:
+            self._with_backend(lambda backend: backend.put(local_path, remote_path))
+        except Exception as e:
+            print(f'[-] Failed to upload: {local_path} because {e}')
+            return False
+        with self._lock:
+            names.add(posixpath.basename(remote_path))
+        return True
+
+    def close(self) -> None:
+        """Wait for all uploads to finish and close all channels.
+        """
+        self._executor.shutdown(wait=True)
+        for backend in self._backends:
+            backend.close()
+        if self._on_close is not None:
+            self._on_close()
+
+
+def _done(result) -> Future:
+    future = Future()
+    future.set_result(result)
+    return future
@@ -0,0 +1,63 @@
+import argparse
+import filecmp
+import shutil
+import sys
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent
+FRONTEND = 'frontend'
+X86 = 'backend_tester_x86'
+ARM = 'backend_tester_arm'
+
+# The modules shared by the testers, and the folders holding a copy of each.
+# The copy in the first folder is the one to edit.
+SHARED = {
+    'caseloader.py': [FRONTEND, X86, ARM],
+    'limits.py': [FRONTEND, X86, ARM],
+    'matcher.py': [FRONTEND, X86, ARM],
+    'pipeline.py': [FRONTEND, X86, ARM],
+    'progress.py': [FRONTEND, X86, ARM],
+    'results_db.py': [FRONTEND, X86, ARM],
+    'runtime.py': [FRONTEND, X86, ARM],
+    'artifacts.py': [FRONTEND, X86],
+    'buildcache.py': [FRONTEND, X86],
+    'compiler_daemon.py': [FRONTEND, X86],
+    'compiletime.py': [FRONTEND, X86],
+    'timing.py': [FRONTEND, ARM],
+}
+
+
+def stale_copies():
+    """Find the copies of shared modules differing from the one to edit.
+
+    Returns:
+        A list of tuple (Path of the one to edit, Path of the copy).
+    """
+    stale = []
+    for module, folders in SHARED.items():
+        source = ROOT/folders[0]/module
+        for folder in folders[1:]:
+            copy = ROOT/folder/module
+            if not copy.exists() or not filecmp.cmp(source, copy, shallow=False):
+                stale.append((source, copy))
+    return stale
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Check that the modules shared by the testers are the same in each folder.'
+    )
+    parser.add_argument('--sync', action='store_true',
+        help='copy each shared module over the stale copies, instead of failing')
+    args = parser.parse_args()
+
+    stale = stale_copies()
+    for source, copy in stale:
+        if args.sync:
+            shutil.copyfile(source, copy)
+            print(f"Copied {source.relative_to(ROOT)} to {copy.relative_to(ROOT)}")
+        else:
+            print(f"{copy.relative_to(ROOT)} differs from {source.relative_to(ROOT)}")
+    if stale and not args.sync:
+        sys.exit(1)
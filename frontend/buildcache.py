@@ -0,0 +1,174 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict
+
+
+class BuildCache:
+    """A persistent on-disk cache of the files generated by compiling testcases.
+
+    Entries are addressed by a key hashing everything the compilation depends on
+    (the source, the compiler jar, the runtime library and the flags), so an entry
+    never goes stale: a changed input simply leads to another key. Each entry is a
+    directory under the cache root holding the generated files by name:
+
+        <cache_dir>/<key[:2]>/<key>/<file name>
+
+    The total size of the cache is bounded. When exceeded, entries least recently
+    used (by the mtime of the entry directory, refreshed on each hit) are evicted.
+
+    Attributes:
+        cache_dir: A Path to the root directory of the cache.
+        max_bytes: The size bound of the cache in bytes.
+        hits: Number of lookups served by the cache since the last reset_stats().
+        misses: Number of lookups missing the cache since the last reset_stats().
+        bytes_saved: Total size of the files restored from the cache since the last
+                    reset_stats().
+    """
+
+    def __init__(self, cache_dir:str, max_bytes:int=1 << 30) -> None:
+        """Initialize a BuildCache, creating the cache directory if not existing.
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+        # Digests of files shared by all testcases (e.g. the compiler jar),
+        # memorized by (path, size, mtime) to hash them only once.
+        self._digests = {}
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._total_bytes = sum(self._entry_size(entry) for entry in self._entries())
+        if self._total_bytes > self.max_bytes:
+            self._evict()
+
+    def file_digest(self, path:str) -> str:
+        """Get the SHA-256 hex digest of the content of a file.
+        """
+        st = os.stat(path)
+        memo_key = (str(path), st.st_size, st.st_mtime_ns)
+        digest = self._digests.get(memo_key)
+        if digest is None:
+            h = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    h.update(chunk)
+            digest = h.hexdigest()
+            self._digests[memo_key] = digest
+        return digest
+
+    def key(self, *paths:str, flags:str='') -> str:
+        """Compute the key of the entry for files generated from the given inputs.
+
+        Args:
+            paths: Strings of paths to all the files the compilation depends on.
+            flags: A string of the flags the compilation is performed with.
+        """
+        h = hashlib.sha256(flags.encode())
+        for path in paths:
+            h.update(self.file_digest(path).encode())
+        return h.hexdigest()
+
+    def fetch(self, key:str, dests:Dict[str, str]) -> bool:
+        """Restore the files of an entry.
+
+        Args:
+            key: A string of the key of the entry.
+            dests: A dict mapping names of the files in the entry to the paths
+                    they are to be restored to.
+
+        Returns:
+            True if the entry exists and all the files are restored. Otherwise, return False.
+        """
+        entry = self._entry_path(key)
+        try:
+            restored = 0
+            for name, dest in dests.items():
+                shutil.copyfile(entry/name, dest)
+                restored += os.path.getsize(dest)
+            # Mark the entry as recently used.
+            os.utime(entry)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return False
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += restored
+        return True
+
+    def store(self, key:str, srcs:Dict[str, str]) -> None:
+        """Store generated files as an entry.
+
+        Args:
+            key: A string of the key of the entry.
+            srcs: A dict mapping names of the files in the entry to the paths of
+                    the files to be stored.
+        """
+        entry = self._entry_path(key)
+        if entry.exists():
+            return
+        os.makedirs(entry.parent, exist_ok=True)
+        # Populate the entry aside and move it in place at once, so that
+        # a concurrent fetch never sees a partial entry.
+        tmp_dir = Path(tempfile.mkdtemp(prefix='.tmp-', dir=entry.parent))
+        for name, src in srcs.items():
+            shutil.copyfile(src, tmp_dir/name)
+        try:
+            os.rename(tmp_dir, entry)
+        except OSError:
+            # Stored by someone else in the meantime.
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+        with self._lock:
+            self._total_bytes += self._entry_size(entry)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def reset_stats(self) -> None:
+        """Reset the hit/miss statistics.
+        """
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.bytes_saved = 0
+
+    def stat_line(self) -> str:
+        """Get a line summarizing the hit/miss statistics.
+        """
+        return (
+            f'Cache: {self.hits} hits, {self.misses} misses, '
+            f'{self.bytes_saved / (1 << 20):.2f} MiB saved\n'
+        )
+
+    def _evict(self) -> None:
+        """Remove least recently used entries until the cache fits its size bound.
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry.stat().st_mtime)
+        for entry in entries:
+            if self._total_bytes <= self.max_bytes:
+                break
+            size = self._entry_size(entry)
+            shutil.rmtree(entry, ignore_errors=True)
+            self._total_bytes -= size
+
+    def _entries(self):
+        return [
+            entry for bucket in self.cache_dir.iterdir() if bucket.is_dir()
+            for entry in bucket.iterdir() if not entry.name.startswith('.tmp-')
+        ]
+
+    def _entry_path(self, key:str) -> Path:
+        return self.cache_dir/key[:2]/key
+
+    @staticmethod
+    def _entry_size(entry:Path) -> int:
+        try:
+            return sum(f.stat().st_size for f in entry.iterdir())
+        except OSError:
+            return 0
@@ -1,41 +1,132 @@
-from genericpath import exists
+from fnmatch import fnmatch
+import json
 import os
 from pathlib import Path
-from sys import stdout
 import shutil
+import threading
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+# The same in all the testers: frontend/, backend_tester_x86/ and backend_tester_arm/.
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, where files are copied instead of reflinked.
+    fcntl = None
+
+# Directories of the input and standard output files of the assembly testcases on
+# the Raspberry Pi (see Loader.io_dirs).
+IN = 'in/'
+STD_OUT = 'std_out/'
+# The ioctl of Linux to clone a file on a copy-on-write filesystem (e.g. Btrfs or XFS).
+FICLONE = 0x40049409
+
+
+def clone_file(src:Path, dst:Path, link:bool=True) -> str:
+    """Put a file with the content of src at dst, as cheaply as the filesystem allows.
+
+    In order of preference: a hard link (if link), a reflink sharing the blocks of
+    src, a copy within the kernel (copy_file_range), and a plain copy. Hard links
+    are only fit for files never written again in place, e.g. the sources and the
+    standard outputs, but not the files generated anew on each run.
+
+    Returns:
+        A string of how the file is put: 'link', 'reflink' or 'copy'.
+    """
+    if os.path.lexists(dst):
+        os.unlink(dst)
+    if link:
+        try:
+            os.link(src, dst)
+            return 'link'
+        except OSError:
+            # e.g. across devices, or not supported by the filesystem.
+            pass
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        if fcntl is not None:
+            try:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                return 'reflink'
+            except OSError:
+                pass
+        if hasattr(os, 'copy_file_range'):
+            try:
+                while os.copy_file_range(fsrc.fileno(), fdst.fileno(), 1 << 30) > 0:
+                    pass
+                return 'copy'
+            except OSError:
+                # Start over in user space.
+                fsrc.seek(0)
+                fdst.seek(0)
+                fdst.truncate()
+        shutil.copyfileobj(fsrc, fdst)
+    return 'copy'
 
 
 class TestCase:
     """A TestCase store the path to a single testcase and its metadata.
-    
+
+    The source is a .sy file for the frontend and x86 testers, and the assembly (.s)
+    compiled from it for the ARM tester. The files generated from the source along
+    the stages (see pipeline.py) are named after the testcase.
+
     Attributes:
-        sy_path: A Path to the source (.sy) 
+        src_path: A Path to the source (.sy or .s)
         in_path: A Path to the possible input file (.in)
         std_out_path: A Path to the standard output file (.out)
-        name: A string of the testcase name w/o file type postfix
+        name: A string of the testcase name w/o file type postfix, unique among the
+                testcases of a run, as the files generated and collected are named after
+                it (see Loader.case)
         ll_name: A string of file name of llvm-ir generated (.ll)
         bc_name: A string of file name of the interpretable bitcode file after linking (.bc)
-        gen_out_name: A string of file name of the execution output from the compiled program 
+        s_name: A string of file name of assembly generated (.s)
+        o_name: A string of file name of object generated (.o)
+        exe_name: A string of file name of the executable linked
+        gen_out_name: A string of file name of the execution output from the compiled program
                     (-gen.out)
     """
 
-    def __init__(self, sy_path:str, std_out_path:str, in_path:str=None) -> None:
-        """Initialzie a TestCase.
+    # Compact, for suites of tens of thousands of testcases. File names derived from
+    # the name are computed on access rather than stored.
+    __slots__ = ('src_path', 'in_path', 'std_out_path', 'name')
+
+    def __init__(self,
+        src_path:str, std_out_path:str, in_path:str=None, name:Optional[str]=None
+    ) -> None:
+        """Initialzie a TestCase, named after the source unless given a name.
         """
-        # Path to the source (.sy) 
-        self.sy_path = Path(sy_path)
+        # Path to the source (.sy or .s)
+        self.src_path = Path(src_path)
         # Path to the possible input file (.in)
         self.in_path = Path(in_path) if in_path else None
         # Path to the standard output file (.out)
         self.std_out_path = Path(std_out_path)
         # Name of the testcase w/o file type postfix
-        self.name = self.sy_path.name.replace(".sy", "")
-        # File name for llvm-ir generated
-        self.ll_name = self.name + ".ll"
-        # File name for the interpretable bitcode file after linking. 
-        self.bc_name = self.name + ".bc"
-        # File name for output log file
-        self.gen_out_name = self.name + "-gen.out"
+        self.name = name if name is not None else self.src_path.stem
+
+    @property
+    def ll_name(self) -> str:
+        return self.name + ".ll"
+
+    @property
+    def bc_name(self) -> str:
+        return self.name + ".bc"
+
+    @property
+    def s_name(self) -> str:
+        return self.name + ".s"
+
+    @property
+    def o_name(self) -> str:
+        return self.name + ".o"
+
+    @property
+    def exe_name(self) -> str:
+        return self.name
+
+    @property
+    def gen_out_name(self) -> str:
+        return self.name + "-gen.out"
 
     def copy_to(self, dest:str) -> Path:
         """Copy all files realted to a testcase to a given directory.
@@ -45,48 +136,250 @@ class TestCase:
         Returns:
             pathlib.Path to the directory created by the methods for storing the copy of the files.
         """
+        return self.collect(dest)[0]
+
+    def collect(self, dest:str, generated:Iterable[Path]=()) -> Tuple[Path, Dict[str, Dict]]:
+        """Collect all files related to a testcase, and the files generated from it, to
+        a given directory (see clone_file).
+
+        The source, the input and the standard output are hard-linked where possible,
+        so that the multi-megabyte inputs of the performance testcases are not
+        duplicated. The files generated (e.g. the .ll and -gen.out files) are written
+        again on the next run, so they are reflinked or copied instead.
+
+        Args:
+            dest: String of the path to the target directory.
+            generated: Paths to the files generated, those not existing skipped.
+
+        Returns:
+            A Path to the directory created for the files, and a dict mapping the
+            names of the files collected to dicts of their "source", "size" and
+            "how" they are collected, as in a FailureManifest.
+        """
         copy_path = Path(dest)/self.name
-        os.makedirs(copy_path)
-        shutil.copyfile(self.sy_path, copy_path/(self.sy_path.name))
-        if not self.in_path is None:
-            shutil.copyfile(self.in_path, copy_path/(self.in_path.name))
-        shutil.copyfile(self.std_out_path, copy_path/(self.std_out_path.name))
-        return copy_path
+        os.makedirs(copy_path, exist_ok=True)
+        files = {}
+        sources = [(path, True) for path in (self.src_path, self.in_path, self.std_out_path)]
+        sources += [(path, False) for path in generated]
+        for path, link in sources:
+            if path is None or not path.exists():
+                continue
+            files[path.name] = {
+                'source': str(path), 'size': path.stat().st_size,
+                'how': clone_file(path, copy_path/path.name, link),
+            }
+        return copy_path, files
 
 
-class Loader:
-    """Loader helps to load TestCase according to a given file path or directory.
+class FailureManifest:
+    """FailureManifest indexes the failed testcases of a run in a single file, one
+    line of JSON for each, appended as they fail:
+
+        {"case": "testcases/perf/median0.sy", "status": "Wrong Answer", "note": "...",
+         "stage": "match", "dir": "wa-cases/median0",
+         "files": {"median0.in": {"source": "...", "size": 4194304, "how": "link"}, ...}}
+
+    As the inputs are hard-linked rather than copied (see TestCase.collect), it is
+    the index, rather than the sizes of the directories, that tells what failed and
+    where each file came from.
 
     Attributes:
-        testcases: A List of TestCases (to be test).
+        path: A Path to the manifest, e.g. failures.jsonl under the root directory.
     """
 
     def __init__(self, path:str) -> None:
-        """Intialize a Load according to a given path.
-        
-        If the path points to a testable file (.sy file), load the file specified
-        as a single TestCase. If the path points to an existing directory, load all
-        testable files under the directory into the testcase list.
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def add(self,
+        testcase:TestCase, status:str, note:str, stage:Optional[str], copy_path:Path,
+        files:Dict[str, Dict]
+    ) -> None:
+        """Record a failed testcase, with the directory and the files collected for it
+        (see TestCase.collect). The directory is recorded relative to the manifest.
+        """
+        line = json.dumps({
+            'case': str(testcase.src_path), 'status': status, 'note': note, 'stage': stage,
+            'dir': Path(os.path.relpath(copy_path, self.path.parent)).as_posix(),
+            'files': files,
+        }) + '\n'
+        with self._lock, open(self.path, 'a') as f:
+            f.write(line)
+
+    def load(self) -> List[Dict]:
+        """Load the records of the failed testcases, in the order they failed.
         """
-        self.testcases = []
-
-        p = Path(path)
-        # If the path points to a testable file (.sy).
-        if p.is_file() and p.suffix == '.sy':
-            std_out_path = p.with_suffix('.out')
-            in_path = p.with_suffix('.in')
-            self.testcases.append(
-                TestCase(p, std_out_path, in_path if in_path.exists() else None)
+        if not self.path.exists():
+            return []
+        with open(self.path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+
+def unique_names(testcases:Iterable[TestCase]) -> Iterator[TestCase]:
+    """Pass testcases through, making sure no two of them are named the same, of
+    which the files generated (e.g. ir/<name>.ll) would overwrite each other.
+
+    Raises:
+        ValueError: If two testcases are named the same.
+    """
+    sources = {}
+    for testcase in testcases:
+        other = sources.setdefault(testcase.name, testcase.src_path)
+        if other != testcase.src_path:
+            raise ValueError(
+                f"testcases {other} and {testcase.src_path} are both named '{testcase.name}', "
+                'load them under a common root or rename one of them'
             )
-        # If the path points to a existing dir,
-        # add all testable files into self.testcases.
-        elif p.is_dir():
-            for file in sorted(p.glob('*.sy')):
-                std_out_path = file.with_suffix('.out')
-                in_path = file.with_suffix('.in')
-                self.testcases.append(
-                    TestCase(file, std_out_path, in_path if in_path.exists() else None)
-                )
+        yield testcase
+
+
+class Loader:
+    """Loader discovers TestCases under given files or directories, lazily.
+
+    Iterating a Loader walks the directories (recursively by default) and yields the
+    TestCases as they are found, so that testing can start before a large tree is
+    walked through. Each directory is listed once, and the input files are looked up
+    in the listing instead of being checked one by one.
+
+    Testcases can be filtered by glob patterns on their paths relative to the root
+    they are found under (e.g. 'performance/*', '*/median*'), and by tags, which are
+    the names of the root and the directories in between (e.g. 'functional').
+
+    Testcases found in the subdirectories are named after their paths relative to the
+    root, e.g. 'sub__a' for <root>/sub/a.sy, so that they don't collide with the
+    testcases of the same file name elsewhere. Testcases named the same still (e.g.
+    a.sy under two roots) are rejected with a ValueError (see unique_names).
+
+    Attributes:
+        paths: A list of Paths to the sources or the roots of suites to load.
+        suffix: A string of the file type of the sources, '.sy' or '.s'.
+        io_dirs: A tuple of strings of paths to the directories of the input and the
+                standard output files, e.g. (IN, STD_OUT) for the assembly on the
+                Raspberry Pi, or None if they are next to the sources.
+        recursive: Bool indicating if to load from the subdirectories as well.
+        include: A list of glob patterns, of which a testcase has to match one, or
+                None to include all.
+        exclude: A list of glob patterns, of which a testcase must match none.
+        tags: A list of tags, of which a testcase has to have one, or None to ignore tags.
+    """
+
+    def __init__(self,
+        *paths:str, suffix:str='.sy', io_dirs:Optional[Tuple[str, str]]=None,
+        recursive:bool=True, include:Optional[List[str]]=None,
+        exclude:Optional[List[str]]=None, tags:Optional[List[str]]=None
+    ) -> None:
+        """Intialize a Loader according to the given paths.
+
+        If a path points to a testable file (of the suffix), load the file specified
+        as a single TestCase. If a path points to an existing directory, load all
+        testable files under the directory.
+        """
+        self.paths = [Path(path) for path in paths]
+        self.suffix = suffix
+        self.io_dirs = io_dirs
+        self.recursive = recursive
+        self.include = include
+        self.exclude = exclude or []
+        self.tags = tags
+
+    def __iter__(self) -> Iterator[TestCase]:
+        return unique_names(self.load())
+
+    def load(self) -> Iterator[TestCase]:
+        inputs = None
+        if self.io_dirs is not None:
+            in_dir = self.io_dirs[0]
+            inputs = set(os.listdir(in_dir)) if os.path.isdir(in_dir) else set()
+        for p in self.paths:
+            # If the path points to a testable file.
+            if p.is_file() and p.suffix == self.suffix:
+                if self.accepts(Path(p.name), {p.parent.name}):
+                    if inputs is None:
+                        in_path = p.with_suffix('.in')
+                        names = {in_path.name} if in_path.exists() else set()
+                    yield self.case(p, names if inputs is None else inputs, p.stem)
+            # If the path points to a existing dir, walk through it.
+            elif p.is_dir():
+                yield from self.walk(p, p, inputs)
+
+    @property
+    def testcases(self) -> List[TestCase]:
+        """A List of all TestCases (to be test), loaded anew on each access.
+        """
+        return list(self)
+
+    def walk(self, root:Path, directory:Path, inputs:Optional[Set[str]]) -> Iterator[TestCase]:
+        with os.scandir(directory) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+        names = {entry.name for entry in entries} if inputs is None else inputs
+        rel_dir = directory.relative_to(root)
+        tags = {root.name, *rel_dir.parts}
+        for entry in entries:
+            if not entry.name.endswith(self.suffix) or not entry.is_file():
+                continue
+            if not self.accepts(rel_dir/entry.name, tags):
+                continue
+            name = '__'.join([*rel_dir.parts, entry.name[:-len(self.suffix)]])
+            yield self.case(directory/entry.name, names, name)
+        if self.recursive:
+            for entry in entries:
+                if entry.is_dir():
+                    yield from self.walk(root, directory/entry.name, inputs)
+
+    def case(self, file:Path, inputs:Set[str], name:str) -> TestCase:
+        """Make the TestCase of a source.
+
+        Args:
+            file: A Path to the source.
+            inputs: A set of the names of the input files existing, in the directory
+                    of the source or the input directory.
+            name: A string of the name of the testcase.
+        """
+        stem = file.name[:-len(self.suffix)]
+        if self.io_dirs is None:
+            in_path, std_out_path = file.parent/(stem + '.in'), file.parent/(stem + '.out')
+        else:
+            in_path = Path(self.io_dirs[0] + stem + '.in')
+            std_out_path = Path(self.io_dirs[1] + stem + '.out')
+        return TestCase(file, std_out_path, in_path if in_path.name in inputs else None, name)
+
+    def accepts(self, rel_path:Path, tags:Set[str]) -> bool:
+        """Check if a testcase passes the filters.
+
+        Args:
+            rel_path: A Path to the source relative to the root it is found under.
+            tags: A set of the tags of the testcase.
+        """
+        path = rel_path.as_posix()
+        if self.include is not None and not any(fnmatch(path, pat) for pat in self.include):
+            return False
+        if any(fnmatch(path, pat) for pat in self.exclude):
+            return False
+        return self.tags is None or not tags.isdisjoint(self.tags)
+
+
+class Scheme(NamedTuple):
+    """A suite of testcases run as a part of a batch (see run_schemes of the testers),
+    along with the other suites in the same session.
+
+    Attributes:
+        name: A string of the name of the suite, which its stat line is led by.
+        testcases: TestCases of the suite, e.g. a Loader.
+        echo: Bool indicating if to echo the process return codes to .out files.
+    """
+    name: str
+    testcases: Iterable[TestCase]
+    echo: bool = True
+
+    @classmethod
+    def from_dict(cls, scheme:Dict, **filters) -> 'Scheme':
+        """Make a Scheme of a dict with the "path" to the suite and "echo", named
+        after the path.
+
+        Args:
+            filters: The filters of the Loader, e.g. include or tags.
+        """
+        return cls(scheme['path'], Loader(scheme['path'], **filters), scheme.get('echo', True))
 
 
 if __name__ == '__main__':
@@ -1,13 +1,78 @@
+import argparse
 import subprocess
 import os
-import shutil
-import sys
+import threading
+import time
 from datetime import datetime
 from pathlib import Path
-import filecmp
-from typing import List, Optional
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, TextIO
 
-from caseloader import TestCase, Loader
+from caseloader import FailureManifest, TestCase, Loader, Scheme, unique_names
+from compiler_daemon import CompilerDaemon
+from buildcache import BuildCache
+from artifacts import ArtifactStore
+from matcher import RunResult, compare_files, run_and_match
+from timing import CaseTiming, TimingReport
+from compiletime import CompileReport
+from scheduler import History
+from results_db import ResultsStore
+from runtime import build_runtime_bc
+from progress import Progress
+from rerun import (
+    RERUN_FAILED, RERUN_CHANGED, case_digest, file_digest, find_last_results,
+    load_results, needs_rerun, write_results
+)
+from limits import (
+    Limits, StageTimeout, run_stage,
+    TIME_LIMIT_EXCEEDED, MEMORY_LIMIT_EXCEEDED, RUNTIME_ERROR
+)
+from pipeline import (
+    ACCEPTED, COMPILATION_ERROR, WRONG_ANSWER, CaseContext, CaseResult, Pipeline,
+    Stage, StageFailed
+)
+
+
+# Abbreviations of the completion status in the statistical conclusion.
+STATUS_ABBRS = [
+    ('AC', ACCEPTED),
+    ('CE', COMPILATION_ERROR),
+    ('WA', WRONG_ANSWER),
+    ('TLE', TIME_LIMIT_EXCEEDED),
+    ('MLE', MEMORY_LIMIT_EXCEEDED),
+    ('RE', RUNTIME_ERROR),
+]
+# Status of the testcases not run for failing fast.
+SKIPPED = 'Skipped'
+
+# Flags of llc and the C compiler compiling the .bc files into native executables.
+NATIVE_FLAGS = '-O2 -relocation-model=pic'
+NATIVE_CC = 'gcc'
+
+
+def stat_line(counts:Counter, total:int) -> str:
+    """Format the statistical conclusion of testcases in stat.log.
+
+    Args:
+        counts: A Counter of the statuses of the testcases.
+        total: Number of the testcases.
+    """
+    return ('✔ ' if counts[ACCEPTED] == total else '! ') + ', '.join(
+        f'{abbr}: {counts[status]:>3}/{total:<3}' for abbr, status in STATUS_ABBRS
+    ) + '\n'
+
+
+def tool_version(cmd:str) -> str:
+    """Get the first line of the version of a tool, or '' if not found.
+    """
+    try:
+        return subprocess.run(
+            [cmd, '--version'], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            universal_newlines=True
+        ).stdout.split('\n')[0]
+    except OSError:
+        return ''
 
 
 class FrontendAutoTester:
@@ -21,15 +86,40 @@ class FrontendAutoTester:
     Attributes:
         java_path: A Path to the java interpreter (under JDK/bin/).
         compiler_path: A Path to the compiler (.jar).
+        jvm_options: A string of the options of the JVMs compiling the testcases.
         root_dir: A Path to the dir created for storing all contents generated by the tester.
         ir_dir: A Path to the subdir storing ir files generated (./<root_dir>/ir)
         out_dir: A Path to the subdir storing all compiled program output (./<root_dir>/out)
         log_path: A Path to the text file storing all matching results (./<root_dir>/result.log)
         stat_path: A Path to the text file storing the final statistical results for each run (./<root_dir>/stat.log)
         max_path_width: The max .sy path width in testcases (for aligning log results on terminal) 
+        compiler_daemon: A CompilerDaemon keeping warm JVMs for compiling, or None if
+                    the compiler is launched with a fresh JVM for each testcase.
+        build_cache: A BuildCache storing .ll/.bc files generated across runs, or None
+                    if the testcases are always compiled.
+        timing_baseline: A string of path to the timing.json of a previous run to compare
+                    the timing of testcases with, or None if not to compare.
+        slowdown_threshold: The relative slowdown beyond which a testcase is flagged.
+        limits: The Limits on time and memory for each stage of testing a testcase.
+        history: A History of the durations and outcomes of testcases to schedule
+                    them by, or None if testcases are run in the given order.
+        results_store: A ResultsStore keeping the results of all runs.
+        native_version: A string of the versions of llc and the C compiler used to
+                    compile native executables, or None if executed with lli.
+        runtime_bc: A Path to the bitcode of the SysY runtime, assembled from sylib.ll
+                    once and cached under .sylib-cache/ (see runtime.build_runtime_bc).
+        link_runtime: Bool indicating if the runtime is linked into each testcase.
+        pipeline: The Pipeline of the stages testing each testcase.
     """
 
-    def __init__(self, compiler_path:str, java_path:str, gen_dir:str) -> None:
+    def __init__(self, 
+        compiler_path:str, java_path:str, gen_dir:str, warm_compiler:bool=False,
+        cache_dir:Optional[str]=None, cache_size:int=1 << 30, keep_output:bool=False,
+        timing_baseline:Optional[str]=None, slowdown_threshold:float=0.1,
+        limits:Optional[Limits]=None, history:Optional[str]=None,
+        results_db:Optional[str]=None, native:bool=False, link_runtime:bool=True,
+        artifacts:Optional[ArtifactStore]=None, jvm_options:str=''
+    ) -> None:
         """Initialize a FrontendAutoTest.
 
         Args:
@@ -38,6 +128,43 @@ class FrontendAutoTester:
             java_path: A string of path to the java interpreter (under JDK/bin/).
             gen_dir: A string of path to the directory where the root dir is created 
                     for storing results.
+            warm_compiler: Bool indicating if to compile testcases with long-lived JVMs
+                    instead of launching a new JVM for each of them.
+            cache_dir: [Optional] A string of path to the directory of a persistent
+                    build cache. Testcases are compiled and linked only if any of the
+                    source, the compiler or the runtime has changed since cached.
+            cache_size: The size bound (in bytes) of the build cache.
+            keep_output: Bool indicating if to write the output of the compiled program
+                    to -gen.out files even when it is correct. By default, the output is
+                    matched as it comes and only written for Wrong Answers.
+            timing_baseline: [Optional] A string of path to the timing.json of a previous
+                    run. Testcases slowed down beyond slowdown_threshold (e.g. 0.1 for 10%)
+                    since then are flagged in stat.log.
+            slowdown_threshold: The relative slowdown beyond which a testcase is flagged.
+            limits: [Optional] The Limits on time (for compiling, linking and executing)
+                    and memory for each testcase. Unlimited by default.
+            history: [Optional] A string of path to the file of the history of testcases
+                    (e.g. out/history.json), which is updated on each run. If given,
+                    testcases failed last time are run first, and the rest the longest
+                    first, which shortens the tail of a run with many jobs.
+            results_db: [Optional] A string of path to the SQLite database to store
+                    the results of each testcase into (see results_db.py). By default,
+                    results.db under gen_dir.
+            native: Bool indicating if to execute the testcases as native executables
+                    compiled from the .bc files with llc (cached along with the .bc
+                    files in the build cache), instead of with lli. The performance
+                    testcases are then measured as native code rather than JIT-ed code.
+            link_runtime: Bool indicating if to link the runtime into each testcase
+                    with llvm-link. If False (and not native), the link stage is
+                    skipped, and lli loads the runtime along with the .ll file instead.
+            artifacts: [Optional] The ArtifactStore to archive the files generated
+                    (under ir/ and out/) into at the end of each run, after which the
+                    runs beyond its retention policy are removed.
+            jvm_options: A string of the options of the JVMs compiling the testcases,
+                    e.g. '-XX:TieredStopAtLevel=1' or '-Xshare:auto', typically from
+                    the "jvm" of the scheme. The seconds compiling each testcase are
+                    written to compile.csv, and summarized in stat.log, to tell if a
+                    tuning helps.
 
         The constructor will also create a new directory named after current datetime 
         under current executing path for storing test results and intermediate files.
@@ -46,6 +173,7 @@ class FrontendAutoTester:
         """
         self.java_path = Path(java_path)
         self.compiler_path = Path(compiler_path)
+        self.jvm_options = jvm_options
         self.root_dir = Path(gen_dir)/Path('testgen-' + datetime.now().strftime(r"%m%d-%H%M%S"))
         self.ir_dir = self.root_dir/"ir"
         self.out_dir = self.root_dir/"out"
@@ -53,7 +181,33 @@ class FrontendAutoTester:
         self.stat_path = self.root_dir/"stat.log"
         self.wrongans_dir = self.root_dir/"wa-cases"
         self.compilerr_dir = self.root_dir/"ce-cases"
+        self.failures = FailureManifest(self.root_dir/"failures.jsonl")
         self.max_path_width = 45
+        self.compiler_daemon = CompilerDaemon(compiler_path, java_path, jvm_options) \
+            if warm_compiler else None
+        self.build_cache = BuildCache(cache_dir, cache_size) if cache_dir else None
+        self.keep_output = keep_output
+        self.timing_baseline = timing_baseline
+        self.slowdown_threshold = slowdown_threshold
+        self.limits = limits if limits is not None else Limits()
+        self.history = History(history) if history is not None else None
+        self.artifacts = artifacts
+        # Parsed as text once, instead of once for linking each testcase.
+        self.runtime_bc = build_runtime_bc()
+        # Native executables are compiled from a single module.
+        self.link_runtime = link_runtime or native
+        self.native_version = None
+        if native:
+            # Native executables are cached by it as well.
+            self.native_version = tool_version('llc') + tool_version(NATIVE_CC)
+        # The LLVM route: compile -> (link ->) (native ->) exec -> match.
+        self.pipeline = Pipeline([
+            Stage('compile', self.compile_ir),
+            *([Stage('link', self.link_ir)] if self.link_runtime else []),
+            *([Stage('native', self.native_bc)] if native else []),
+            Stage('exec', self.exec_ir),
+            Stage('match', self.match_output),
+        ], on_failure=self.keep_failed)
 
         # Create a dir to store generated files.
         os.makedirs(self.root_dir)
@@ -61,163 +215,483 @@ class FrontendAutoTester:
         os.makedirs(self.out_dir)
         os.makedirs(self.wrongans_dir)
         os.makedirs(self.compilerr_dir)
+        self.results_store = ResultsStore(
+            results_db if results_db is not None else Path(gen_dir)/'results.db'
+        )
 
     def run(self, 
-        testcases: List[TestCase], echo_ret:bool=True, terminal_log=True) -> None:
+        testcases: Iterable[TestCase], echo_ret:bool=True, terminal_log=True, jobs:int=1,
+        rerun:Optional[str]=None, previous:Optional[str]=None,
+        fail_fast:Optional[int]=None, stage_jobs:Optional[Dict[str, int]]=None,
+        schemes:Optional[Dict[TestCase, Scheme]]=None
+    ) -> None:
         """Run through all the testcases to generate results.
 
         Args:
+            testcases: TestCases to run, e.g. a Loader.
             echo_ret: Bool indicating if to echo the process return codes to .out files.
+            jobs: Number of testcases to be compiled and executed concurrently.
+                With jobs > 1, the compile/link/run/match pipeline of the testcases
+                is driven by a pool of worker threads, while results are still logged
+                (to result.log) in the order of the given testcases. On the terminal,
+                the testcases are printed as they finish, below which the testcases in
+                flight, the throughput and the counts so far are shown (see progress.py).
+            rerun: [Optional] 'failed' to test only the testcases failed in the previous
+                run, or 'changed' to test only those of which the source, the input,
+                the standard output, the compiler or the runtime has changed since
+                (see rerun.needs_rerun). Testcases with their inputs changed are
+                always tested. The results of the others are carried over from the
+                previous run, so that the logs still cover all the testcases.
+            previous: [Optional] A string of path to the directory (or results.json)
+                of the previous run to rerun from. By default, the latest run under
+                the same directory as this one.
+            fail_fast: [Optional] Number of failed testcases after which the rest are
+                skipped rather than run.
+            stage_jobs: [Optional] A dict mapping stages ('compile', 'link', 'native',
+                'exec' and 'match') to the number of testcases allowed in them at the
+                same time, bounded by jobs, e.g. {'exec': 1} to compile with all the
+                jobs but execute the performance testcases one by one, undisturbed.
+            schemes: [Optional] A dict mapping the testcases to the Schemes they are
+                of, if run as a batch of several schemes (see run_schemes). The echo
+                of each testcase is then taken from its scheme, and a stat line is
+                written for each scheme before the combined one.
         """
+        # Loaded all at once, as the testcases are scheduled and logged in order.
+        # Named uniquely, as the files generated are named after the testcases.
+        testcases = list(unique_names(testcases))
+        if not testcases:
+            print('No testcases to run.')
+            return
         # Adjust logging format.
-        new_width = max([len(str(tc.sy_path)) for tc in testcases])
+        new_width = max((len(str(tc.src_path)) for tc in testcases), default=0)
         if new_width > self.max_path_width:
             self.max_path_width = new_width
         # Statistic Info
-        cnt_wrongans = 0
-        cnt_compilerr = 0
-        cnt_accecpt = 0
+        counts = Counter()
+        # Of each scheme, by name, in the order of the schemes.
+        scheme_counts = {}
+
+        # Records of the testcases, as results.json for later reruns.
+        digests = {
+            'compiler': file_digest(self.compiler_path),
+            'runtime': file_digest('sylib.ll'),
+        }
+        case_digests = {tc: case_digest(tc) for tc in testcases}
+        records = {}
+        carried = {}
+        if rerun is not None:
+            if previous is None:
+                previous = find_last_results(self.root_dir.parent, exclude=self.root_dir)
+            last = load_results(previous) if previous is not None else {}
+            for tc in testcases:
+                record = last.get(str(tc.src_path))
+                # Skipped by fail-fast rather than tested (as recorded by older runs).
+                if record is not None and record['status'] == SKIPPED:
+                    continue
+                if not needs_rerun(record, rerun, dict(digests, case=case_digests[tc])):
+                    carried[tc] = record
+        to_run = [tc for tc in testcases if tc not in carried]
+
+        # Warm up a JVM for each of the workers.
+        if self.compiler_daemon is not None and not self.compiler_daemon.start(max(jobs, 1)):
+            print('Compiler daemon unavailable, fall back to a JVM per testcase.')
+        if self.build_cache is not None:
+            self.build_cache.reset_stats()
+        timing_report = TimingReport(self.timing_baseline, self.slowdown_threshold)
+        compile_report = CompileReport(self.jvm_options, self.compiler_daemon is not None)
+
+        # Schedule the testcases by the history if any.
+        order = self.history.schedule(to_run) if self.history is not None else to_run
+        stop = threading.Event()
+        for stage, n in (stage_jobs or {}).items():
+            self.pipeline.limit(stage, n)
+        progress = Progress(
+            len(order), STATUS_ABBRS, self.max_path_width,
+            live=None if terminal_log else False
+        )
+
+        def run_scheduled(testcase:TestCase):
+            if stop.is_set():
+                progress.finish(testcase, SKIPPED)
+                return CaseResult(SKIPPED, f'after {fail_fast} failures'), 0.0
+            progress.start(testcase)
+            start = time.perf_counter()
+            echo = schemes[testcase].echo if schemes is not None else echo_ret
+            result = self.run_case(testcase, echo, False, progress)
+            seconds = time.perf_counter() - start
+            progress.finish(
+                testcase, result.status,
+                self.log_line(testcase, result.status, result.note) if terminal_log else ''
+            )
+            return result, seconds
+
+        run_id = self.results_store.begin_run(
+            'frontend', str(self.root_dir), digests['compiler']
+        )
 
         # Run.
-        with open(self.log_path, 'a+') as log_file, open(self.stat_path, 'a+') as stat_file:
-            # Loop through each test case.
-            for testcase in testcases:                
-                out_path = self.out_dir/testcase.gen_out_name
-                ll_path = self.ir_dir/testcase.ll_name
+        with open(self.log_path, 'a+') as log_file, open(self.stat_path, 'a+') as stat_file, \
+            ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor, progress:
+            if jobs > 1:
+                # Testcases are handed out to the workers in order, and results
+                # are yielded in the same order no matter in which order the
+                # workers finish them.
+                statuses = executor.map(run_scheduled, order)
+            else:
+                statuses = map(run_scheduled, order)
+            outcomes = {}
+            failures = 0
+            for testcase, (result, seconds) in zip(order, statuses):
+                outcomes[testcase] = result
+                status, note = result.status, result.note
+                if status == SKIPPED:
+                    continue
+                if self.history is not None:
+                    self.history.update(testcase, seconds, status)
+                if status != ACCEPTED:
+                    failures += 1
+                    if fail_fast is not None and failures >= fail_fast:
+                        stop.set()
+            progress.close()
+            if self.history is not None:
+                self.history.save()
 
-                if terminal_log:
-                    print(str(testcase.sy_path).ljust(self.max_path_width, ' ') + f' \tRunning', 
-                    end='\r')
-
-                bc_path = self.gen_ir(testcase)
-                if bc_path is None:
-                    status = 'Compilation Error'
-                    cnt_compilerr += 1
-                    # Copy the error-compiled testcase to the CE-directory.
-                    p = testcase.copy_to(self.compilerr_dir)
-                    if os.path.exists(ll_path):
-                        shutil.copyfile(ll_path, p/(ll_path.name))
+            # Log each test case in order.
+            for testcase in testcases:
+                if testcase in carried:
+                    record = carried[testcase]
+                    records[str(testcase.src_path)] = record
+                    status, timing = record['status'], None
+                    note = '; '.join(filter(None, [record['note'], f"from {record['run']}"]))
+                    # Recorded as carried, not timed, so that the rows agree with the stat line.
+                    if status != SKIPPED:
+                        self.results_store.add(run_id, testcase.src_path, status, note)
+                    if terminal_log:
+                        print(self.log_line(testcase, status, note), end='')
                 else:
-                    self.run_ir(bc_path, out_path, testcase.in_path, echo_ret)
-                    if self.match(out_path, testcase.std_out_path):
-                        status = 'Accecpted'
-                        cnt_accecpt += 1
-                    else:
-                        status = 'Wrong Answer'
-                        cnt_wrongans += 1
-                        # Copy the wrongly answered testcase to the WA-directory.
-                        p = testcase.copy_to(self.wrongans_dir)
-                        shutil.copyfile(ll_path, p/(ll_path.name))
-                        shutil.copyfile(out_path, p/out_path.name)
-                log = (
-                    str(testcase.sy_path).ljust(self.max_path_width, ' ')
-                    + f' \t{status}\n'
-                )
-                log_file.write(log)
+                    result = outcomes[testcase]
+                    status, note, timing = result.status, result.note, result.timing
+                    # Left out of results.json unless tested, so that a rerun tests it.
+                    if status != SKIPPED:
+                        records[str(testcase.src_path)] = dict(
+                            digests, digest=case_digests[testcase], status=status, note=note,
+                            run=self.root_dir.name
+                        )
+                    if 'compile' in result.stages:
+                        compile_report.add(str(testcase.src_path), result.stages['compile'])
+                    if status != SKIPPED:
+                        self.results_store.add(
+                            run_id, testcase.src_path, status, note, result.stages,
+                            result.returncode, result.output_size,
+                            timing.max_rss if timing is not None else None
+                        )
+                counts[status] += 1
+                if schemes is not None:
+                    scheme_counts.setdefault(schemes[testcase].name, Counter())[status] += 1
+                log_file.write(self.log_line(testcase, status, note))
+                if timing is not None:
+                    timing_report.add(timing)
+            # Statistical conclusion, of each scheme and then of all.
+            for name, scheme_count in scheme_counts.items():
+                scheme_conclu = f'[{name}] ' + stat_line(scheme_count, sum(scheme_count.values()))
+                stat_file.write(scheme_conclu)
                 if terminal_log:
-                    print(log, end='')
-            # Statistical conclusion.
-            stat_conclu = \
-                ('✔ ' if cnt_wrongans == 0 and cnt_compilerr == 0 else '! ') + (
-                    f'AC: {cnt_accecpt:>3}/{len(testcases):<3}, '
-                    f'CE: {cnt_compilerr:>3}/{len(testcases):<3}, '
-                    f'WA: {cnt_wrongans:>3}/{len(testcases):<3}\n'
-                )
+                    print(scheme_conclu, end='')
+            stat_conclu = stat_line(counts, len(testcases))
             stat_file.write(stat_conclu)
             if terminal_log:
                 print(stat_conclu, end='')
+            self.results_store.end_run(run_id, stat_conclu)
+            if stop.is_set():
+                stop_line = f'Fail-fast: {counts[SKIPPED]} skipped after {fail_fast} failures\n'
+                stat_file.write(stop_line)
+                if terminal_log:
+                    print(stop_line, end='')
+            if rerun is not None:
+                rerun_line = (
+                    f'Rerun ({rerun}): {len(to_run)} tested, '
+                    f'{len(carried)} carried over from {previous}\n'
+                )
+                stat_file.write(rerun_line)
+                if terminal_log:
+                    print(rerun_line, end='')
+            write_results(self.root_dir, records)
+            if self.build_cache is not None:
+                stat_file.write(self.build_cache.stat_line())
+                if terminal_log:
+                    print(self.build_cache.stat_line(), end='')
+            # Timing table and regressions since the baseline.
+            timing_report.write(self.root_dir)
+            if self.timing_baseline is not None:
+                stat_file.write(timing_report.stat_line())
+                if terminal_log:
+                    print(timing_report.stat_line(), end='')
+            # Seconds compiling, of the testcases not served by the build cache.
+            compile_report.write(self.root_dir)
+            stat_file.write(compile_report.stat_line())
+            if terminal_log:
+                print(compile_report.stat_line(), end='')
+            if self.artifacts is not None:
+                self.archive(stat_file, terminal_log)
 
-    
-    def gen_ir(self, testcase:TestCase) -> str:
-        """Generate interpretable .bc file for lli.
+    def archive(self, stat_file:TextIO, terminal_log=True) -> None:
+        """Archive the files generated by the run into the artifact store, and collect
+        the garbage of it, appending the summaries to stat.log.
+        """
+        for line in (
+            self.artifacts.archive(self.root_dir, ['ir', 'out']),
+            self.artifacts.collect_garbage()
+        ):
+            stat_file.write(line)
+            if terminal_log:
+                print(line, end='')
+
+    def run_schemes(self, schemes:List[Scheme], terminal_log=True, jobs:int=1, **options) -> None:
+        """Run several schemes (e.g. the functional and the performance suites) as a
+        single batch.
+
+        The testcases of all the schemes are run by the same pool of workers, so
+        that a scheme does not wait for the tail of the previous one, and all of them
+        share this session: the warm JVMs, the build cache and the runtime. Each
+        scheme gets its own stat line in stat.log, followed by the combined one.
 
         Args:
-            testcase: A TestCase to be compiled.
-        
+            schemes: A list of the Schemes, of which the testcases are logged in order.
+            jobs: Number of testcases to be compiled and executed concurrently.
+            options: The other options of run, e.g. rerun or stage_jobs.
+        """
+        testcase_schemes = {}
+        for scheme in schemes:
+            for testcase in scheme.testcases:
+                testcase_schemes[testcase] = scheme
+        self.run(
+            list(testcase_schemes), terminal_log=terminal_log, jobs=jobs,
+            schemes=testcase_schemes, **options
+        )
+
+    def log_line(self, testcase:TestCase, status:str, note:str='') -> str:
+        """Format the line of the result of a testcase in result.log.
+        """
+        return (
+            str(testcase.src_path).ljust(self.max_path_width, ' ')
+            + f' \t{status}'
+            + (f' ({note})\n' if note else '\n')
+        )
+
+    def run_case(self, 
+        testcase:TestCase, echo_ret:bool=True, terminal_log=True,
+        progress:Optional[Progress]=None
+    ) -> CaseResult:
+        """Compile, execute and match a single testcase through the pipeline.
+
+        Args:
+            testcase: A TestCase to be tested.
+            echo_ret: Bool indicating if to echo the process return codes to .out files.
+            terminal_log: Bool indicating if to print a running hint to the terminal.
+            progress: [Optional] The Progress of the run, to show the stage the
+                    testcase is in.
+
         Returns:
-            A string of path to the bitcode successfully generated. If any errors
-            occurring during compilation, return None.
+            The CaseResult of the testcase.
 
-        The testcase will be firstly compiled by the compiler to generate the 
-        (intermediate) .ll file, which will then be linked with the SysY runtime
-        by llvm-link producing self-contained .bc bitcode file.
-        Presume the runtime library sylib.ll is under current directory.
+        All files touched are named after the testcase, so that different 
+        testcases can be run safely from different threads at the same time.
         """
-        # Compile the .sy file with our compiler.
-        ll_path = f"{self.ir_dir}/{testcase.ll_name}"
-        cmd_compile = (
-            f"{self.java_path}"
-            f" -jar {self.compiler_path}"
-            f" -emit-llvm {ll_path}"
-            f" {testcase.sy_path}"
+        if terminal_log:
+            print(str(testcase.src_path).ljust(self.max_path_width, ' ') + f' \tRunning', 
+            end='\r')
+        return self.pipeline.run(
+            testcase, on_stage=progress.stage if progress is not None else None,
+            echo_ret=echo_ret
         )
-        subprocess.run(
-            cmd_compile.split(),
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL
+
+    def keep_failed(self, ctx:CaseContext, result:CaseResult) -> None:
+        """Collect a failed testcase with the files generated to the CE- or WA-directory,
+        and record it in failures.jsonl.
+        """
+        ll_path = self.ir_dir/ctx.testcase.ll_name
+        out_path = self.out_dir/ctx.testcase.gen_out_name
+        if ctx.failed_stage in ('compile', 'link', 'native'):
+            p, files = ctx.testcase.collect(self.compilerr_dir, [ll_path])
+        else:
+            p, files = ctx.testcase.collect(self.wrongans_dir, [out_path, ll_path])
+        self.failures.add(
+            ctx.testcase, result.status, result.note, ctx.failed_stage, p, files
         )
+
+    def compile_ir(self, ctx:CaseContext) -> Optional[bool]:
+        """The compile stage: compile the .sy file to .ll with our compiler, unless
+        the .ll/.bc files are served by the build cache.
+
+        Raises:
+            StageFailed: If the compiler fails, or runs out of its time limit.
+        """
+        testcase = ctx.testcase
+        ll_path = self.ir_dir/testcase.ll_name
+        bc_path = self.ir_dir/testcase.bc_name
+        ctx.artifacts['ll'] = ll_path
+        cached = {'ir.ll': ll_path, 'ir.bc': bc_path} if self.link_runtime \
+            else {'ir.ll': ll_path}
+        # Reuse the files generated from identical inputs if cached.
+        if self.build_cache is not None:
+            ctx.cache_key = self.build_cache.key(
+                testcase.src_path, self.compiler_path, 'sylib.ll',
+                flags='-emit-llvm' if self.link_runtime else '-emit-llvm -no-link'
+            )
+            if self.build_cache.fetch(ctx.cache_key, cached):
+                if self.link_runtime:
+                    ctx.artifacts['bc'] = bc_path
+                return False
+
+        # Compile the .sy file with our compiler.
+        args_compile = f"-emit-llvm {ll_path} {testcase.src_path}".split()
+        try:
+            served = self.compiler_daemon is not None and self.compiler_daemon.compile(
+                args_compile, ll_path, self.limits.compile_timeout
+            ) is not None
+        except subprocess.TimeoutExpired:
+            raise StageTimeout('compile', self.limits.compile_timeout)
+        if not served:
+            cmd_compile = f"{self.java_path} {self.jvm_options} -jar {self.compiler_path}".split()
+            run_stage(cmd_compile + args_compile, 'compile', self.limits.compile_timeout)
         # If the compiler didn't successfully generate an .ll file.
         if not os.path.exists(ll_path):
-            return None
-
-        # Link sysY runtime into the generated .ll file
-        # retrieving the interpretable .bc file.
-        bc_path = f"{self.ir_dir}/{testcase.bc_name}"
-        cmd_link = f"llvm-link {ll_path} sylib.ll -o {bc_path}"
-        subprocess.run(
-            cmd_link.split(),
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL
-        )
+            raise StageFailed(COMPILATION_ERROR)
+        # Otherwise stored once linked.
+        if self.build_cache is not None and not self.link_runtime:
+            self.build_cache.store(ctx.cache_key, cached)
+
+    def link_ir(self, ctx:CaseContext) -> Optional[bool]:
+        """The link stage: link the SysY runtime into the .ll file generated, retrieving
+        the interpretable .bc file.
+
+        Raises:
+            StageFailed: If llvm-link fails, or runs out of its time limit.
+        """
+        if 'bc' in ctx.artifacts:
+            # Served by the build cache.
+            return False
+        ll_path = ctx.artifacts['ll']
+        bc_path = self.ir_dir/ctx.testcase.bc_name
+        cmd_link = f"llvm-link {ll_path} {self.runtime_bc} -o {bc_path}"
+        run_stage(cmd_link.split(), 'link', self.limits.link_timeout)
         # If the llvm-linker didn't successfully generate a .bc file.
         if not os.path.exists(bc_path):
-            return None
+            raise StageFailed(COMPILATION_ERROR)
+        ctx.artifacts['bc'] = bc_path
+
+        if self.build_cache is not None:
+            self.build_cache.store(ctx.cache_key, {'ir.ll': ll_path, 'ir.bc': bc_path})
+
+    def native_bc(self, ctx:CaseContext) -> Optional[bool]:
+        """The native stage: compile the .bc file into a native executable with llc,
+        unless served by the build cache.
+
+        Raises:
+            StageFailed: If llc or the C compiler fails, or runs out of the time limit
+                    for linking.
+        """
+        bc_path = ctx.artifacts['bc']
+        obj_path = self.ir_dir/ctx.testcase.o_name
+        exe_path = self.ir_dir/ctx.testcase.exe_name
+        ctx.artifacts['exe'] = exe_path
+        # Keyed by the bitcode, which has the runtime linked in.
+        if self.build_cache is not None:
+            cache_key = self.build_cache.key(
+                bc_path, flags=f'{NATIVE_FLAGS} {self.native_version}'
+            )
+            if self.build_cache.fetch(cache_key, {'native': exe_path}):
+                # Not kept by copying.
+                os.chmod(exe_path, 0o755)
+                return False
+
+        cmd_llc = f"llc {NATIVE_FLAGS} -filetype=obj {bc_path} -o {obj_path}"
+        run_stage(cmd_llc.split(), 'native', self.limits.link_timeout)
+        cmd_cc = f"{NATIVE_CC} {obj_path} -o {exe_path}"
+        if os.path.exists(obj_path):
+            run_stage(cmd_cc.split(), 'native', self.limits.link_timeout)
+        # If no executable is successfully generated.
+        if not os.path.exists(exe_path):
+            raise StageFailed(COMPILATION_ERROR)
+
+        if self.build_cache is not None:
+            self.build_cache.store(cache_key, {'native': exe_path})
 
-        return bc_path
+    def exec_ir(self, ctx:CaseContext) -> None:
+        """The exec stage: run the .bc file with lli (or the native executable if
+        compiled), matching the output as it comes.
+
+        Raises:
+            StageFailed: If the program fails to even start.
+        """
+        testcase = ctx.testcase
+        out_path = self.out_dir/testcase.gen_out_name
+        ctx.artifacts['out'] = out_path
+        try:
+            if 'exe' in ctx.artifacts:
+                ctx.run = run_and_match(
+                    [str(ctx.artifacts['exe'])], out_path, testcase.std_out_path,
+                    testcase.in_path, ctx.options['echo_ret'], self.keep_output,
+                    self.limits.exec_timeout, self.limits.rlimits()
+                )
+            elif 'bc' in ctx.artifacts:
+                ctx.run = self.run_ir(
+                    ctx.artifacts['bc'], out_path, testcase.in_path,
+                    ctx.options['echo_ret'], testcase.std_out_path
+                )
+            else:
+                ctx.run = self.run_ir(
+                    ctx.artifacts['ll'], out_path, testcase.in_path,
+                    ctx.options['echo_ret'], testcase.std_out_path, self.runtime_bc
+                )
+        except OSError as e:
+            raise self.limits.start_failure(e)
+        ctx.stages['exec'] = ctx.run.wall_time
+        ctx.timing = CaseTiming(
+            testcase.src_path, ctx.run.wall_time, ctx.run.max_rss, ctx.run.stderr
+        )
+
+    def match_output(self, ctx:CaseContext) -> None:
+        """The match stage: judge the execution by the limits and the standard output.
+
+        Raises:
+            StageFailed: If the program ended abnormally or answered wrong.
+        """
+        self.limits.check(ctx.run)
 
     def run_ir(self, 
-        bc_path:str, out_path:str, in_path:Optional[str]=None, echo_ret:bool=True
-    ) -> None:
+        bc_path:str, out_path:str, in_path:Optional[str]=None, echo_ret:bool=True,
+        std_out_path:Optional[str]=None, runtime:Optional[str]=None
+    ) -> RunResult:
         """Run a interpretable (self-contained) .bc file using lli.
 
         Args:
-            ll_path: A string of the path to the interpretable bitcode file.
+            bc_path: A string of the path to the interpretable bitcode (or .ll) file.
             out_path: A string of the path to the file for stdout (output).
             in_path: [Optional] A string of the path to the file for stdin (intput).
             echo_ret: Bool indicating if to echo the process return codes to .out files.
+            std_out_path: [Optional] A string of the path to the standard output to 
+                    match the output against as it comes. If given, the output is
+                    written to out_path only when it is wrong (or keep_output is set).
+            runtime: [Optional] A string of the path to the runtime to load along with
+                    the file, if not linked into it.
+
+        Returns:
+            The RunResult of the execution, including the Mismatch of the output against
+            the standard one, and the timing and resource usage.
         """
-        cmd_lli = f'lli {bc_path}'
-
-        with open(out_path, 'w+') as out_file:
-            # Has input
-            if in_path is None: 
-                p = subprocess.run(
-                    cmd_lli.split(), 
-                    stdout=out_file,
-                    stderr=subprocess.DEVNULL
-                )
-            # No input
-            else:               
-                with open(in_path, 'r') as in_file:
-                    p = subprocess.run(
-                        cmd_lli.split(), 
-                        stdin=in_file, 
-                        stdout=out_file,
-                        stderr=subprocess.DEVNULL
-                    )
-
-            # Echo the return value to the output if required.
-            if echo_ret:
-                # If the execution generates any output, and the last character
-                # is not a newline ('\n'), then
-                # echo to switch to a new line for the return value.
-                if os.path.getsize(out_path) > 0:
-                    with open(out_path, 'r') as f:
-                        last_ch = f.read()[-1]
-                    if last_ch != '\n':
-                        subprocess.run('echo', stdout=out_file)
-                subprocess.run(f'echo {p.returncode}'.split(), stdout=out_file)
-            
+        cmd_lli = f'lli {bc_path}' if runtime is None \
+            else f'lli -extra-module={runtime} {bc_path}'
+        return run_and_match(
+            cmd_lli.split(), out_path, std_out_path, in_path, echo_ret, self.keep_output,
+            self.limits.exec_timeout, self.limits.rlimits()
+        )
+
+    def shutdown(self) -> None:
+        """Stop the warm JVMs if any.
+        """
+        if self.compiler_daemon is not None:
+            self.compiler_daemon.shutdown()
 
     def match(self, file1:str, file2:str) -> bool:
         """Match contents of the two files.
@@ -227,28 +701,33 @@ class FrontendAutoTester:
             file2: A string of the path to the 2nd text file.
 
         Returns:
-            True if the two files are identical. Otherwise, return False.
+            True if the two files are identical, ignoring white spaces at the end
+            of lines (as `diff -Z` does). Otherwise, return False.
         """
-        if sys.platform.startswith('linux'):
-            diff_command = ["diff", "-Z", file1, file2]
-            result = subprocess.run(diff_command, capture_output=True, text=True)
-            return result.returncode == 0
-        else:
-            return filecmp.cmp(file1, file2, shallow=False)
-        
+        return compare_files(file1, file2) is None
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Test the compiler frontend.')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--rerun-failed', dest='rerun', action='store_const', const=RERUN_FAILED,
+        help='test only the testcases failed (or changed) in the last run')
+    mode.add_argument('--changed-only', dest='rerun', action='store_const', const=RERUN_CHANGED,
+        help='test only the testcases changed (or with the compiler changed) since the last run')
+    args = parser.parse_args()
+
     compiler_path = "./Cbias.jar"
     java_path = "./jdk-17.0.3.1/bin/java"
     out_dir = "./out"
 
     scheme = {
-        
+        # Options of the JVMs compiling, e.g. "-XX:TieredStopAtLevel=1".
+        "jvm" : "",
     }
     # loader = Loader("testcases/myTestcases")
     loader = Loader("testcases/performance/median0.sy")
 
-    tester = FrontendAutoTester(compiler_path, java_path, out_dir)
+    tester = FrontendAutoTester(compiler_path, java_path, out_dir, jvm_options=scheme.get("jvm", ""))
 
     # tester.run(echo_ret=False)
-    tester.run(loader.testcases)
+    tester.run(loader, rerun=args.rerun)
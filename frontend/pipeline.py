@@ -0,0 +1,190 @@
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, List, NamedTuple, Optional
+
+from caseloader import TestCase
+
+if TYPE_CHECKING:
+    # Not in backend_tester_x86/, which never executes a testcase.
+    from timing import CaseTiming
+
+# The same in all the testers: frontend/, backend_tester_x86/ and backend_tester_arm/.
+
+# As the status is logged.
+ACCEPTED = 'Accecpted'
+COMPILATION_ERROR = 'Compilation Error'
+WRONG_ANSWER = 'Wrong Answer'
+
+
+class StageFailed(Exception):
+    """Raised by a stage to stop testing a testcase, with the status to report.
+
+    Attributes:
+        status: A string of the completion status of the testcase.
+        note: A string of note on the status, which may be empty.
+    """
+
+    def __init__(self, status:str, note:str='') -> None:
+        super().__init__(note or status)
+        self.status = status
+        self.note = note
+
+
+class CaseResult(NamedTuple):
+    """Result of testing a single testcase.
+
+    Attributes:
+        status: A string of the completion status of the testcase.
+        note: A string of note on the status (e.g. where the output goes wrong),
+                which may be empty.
+        timing: The CaseTiming (see timing.py) of the execution, or None if not executed.
+        stages: A dict mapping stages (e.g. 'compile', 'link' and 'exec') to the
+                seconds spent in them.
+        returncode: The return code of the program, or None if not executed.
+        output_size: Size of the output of the program in bytes, or None if not executed.
+    """
+    status: str
+    note: str = ''
+    timing: Optional['CaseTiming'] = None
+    stages: Dict[str, float] = {}
+    returncode: Optional[int] = None
+    output_size: Optional[int] = None
+
+
+class CaseContext:
+    """State of a testcase passed along the stages of a Pipeline.
+
+    Attributes:
+        testcase: The TestCase tested.
+        options: A dict of the options of testing, e.g. 'echo_ret'.
+        artifacts: A dict mapping kinds of files (e.g. 'll', 'bc', 's', 'exe' and
+                'out') to the Paths of those produced by the stages so far.
+        stages: A dict mapping stages to the seconds spent in them.
+        cache_key: A string of the key of the artifacts in the build cache, if any.
+        run: The RunResult (see matcher.py) of the execution, or None if not executed.
+        timing: The CaseTiming of the execution, or None if not executed.
+        failed_stage: A string of the name of the stage failed, or None.
+    """
+
+    def __init__(self, testcase:TestCase, **options) -> None:
+        self.testcase = testcase
+        self.options = options
+        self.artifacts = {}
+        self.stages = {}
+        self.cache_key = None
+        self.run = None
+        self.timing = None
+        self.failed_stage = None
+
+    def result(self, status:str, note:str='') -> CaseResult:
+        if self.run is None:
+            return CaseResult(status, note, stages=self.stages)
+        return CaseResult(
+            status, note, self.timing, self.stages, self.run.returncode,
+            self.run.output_size
+        )
+
+
+class Stage(NamedTuple):
+    """A stage of testing, e.g. compiling.
+
+    Attributes:
+        name: A string of the name of the stage, under which its time is recorded.
+        run: A function doing the stage on a CaseContext. It raises StageFailed to
+                stop testing the testcase, and returns False if there was nothing to
+                do (e.g. the artifacts were served by the build cache), so that no
+                time is recorded for the stage.
+    """
+    name: str
+    run: Callable[[CaseContext], Optional[bool]]
+
+
+class Pipeline:
+    """Pipeline tests a testcase through a configuration of stages.
+
+    The testers differ only in the stages configured: compile -> link -> exec ->
+    match for the LLVM route of the frontend, compile (and ship) for the x86 backend,
+    and link -> exec -> match for the assembly on the Raspberry Pi.
+
+    Testcases can be tested through a Pipeline by many threads at the same time, and
+    each stage can be bounded in how many testcases are in it at once (see limit),
+    e.g. to compile many testcases at once but execute them one by one.
+
+    Attributes:
+        stages: A list of the Stages, in order.
+        status: A string of the status of the testcases passing all the stages.
+        on_failure: [Optional] A function called with the CaseContext and the
+                CaseResult of each testcase failed, e.g. to keep its files.
+        slots: A dict mapping the names of the stages bounded to the semaphores of
+                the testcases allowed in them.
+    """
+
+    def __init__(self,
+        stages:List[Stage], status:str=ACCEPTED,
+        on_failure:Optional[Callable[[CaseContext, CaseResult], None]]=None,
+        slots:Optional[Dict[str, int]]=None
+    ) -> None:
+        self.stages = stages
+        self.status = status
+        self.on_failure = on_failure
+        self.slots = {}
+        for name, n in (slots or {}).items():
+            self.limit(name, n)
+
+    def limit(self, name:str, n:Optional[int]) -> None:
+        """Allow at most n testcases in a stage at the same time, or any number if
+        n is None. Testcases wait for a slot before entering the stage, and the
+        waiting is not timed as part of the stage.
+        """
+        if n is None:
+            self.slots.pop(name, None)
+        else:
+            self.slots[name] = threading.BoundedSemaphore(n)
+
+    def run(self,
+        testcase:TestCase, artifacts:Optional[Dict[str, Path]]=None,
+        on_stage:Optional[Callable[[TestCase, str], None]]=None, **options
+    ) -> CaseResult:
+        """Test a testcase through the stages.
+
+        Args:
+            testcase: A TestCase to be tested.
+            artifacts: [Optional] A dict of the artifacts produced already, e.g.
+                    by linking all the testcases up front.
+            on_stage: [Optional] A function called with the testcase and the name of
+                    each stage as it enters the stage, e.g. Progress.stage.
+            options: The options of testing, passed to the stages.
+
+        Returns:
+            The CaseResult of the testcase.
+        """
+        ctx = CaseContext(testcase, **options)
+        ctx.artifacts.update(artifacts or {})
+        for stage in self.stages:
+            slot = self.slots.get(stage.name)
+            if slot is not None:
+                slot.acquire()
+            if on_stage is not None:
+                on_stage(testcase, stage.name)
+            start = time.perf_counter()
+            failure = None
+            try:
+                done = stage.run(ctx)
+            except StageFailed as e:
+                failure = e
+            finally:
+                seconds = time.perf_counter() - start
+                if slot is not None:
+                    slot.release()
+            if failure is not None:
+                ctx.stages.setdefault(stage.name, seconds)
+                ctx.failed_stage = stage.name
+                result = ctx.result(failure.status, failure.note)
+                if self.on_failure is not None:
+                    self.on_failure(ctx, result)
+                return result
+            if done is not False:
+                # Unless recorded by the stage itself, e.g. as the time of the program.
+                ctx.stages.setdefault(stage.name, seconds)
+        return ctx.result(self.status)
@@ -0,0 +1,166 @@
+import shutil
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, TextIO, Tuple
+
+from caseloader import TestCase
+
+# The same in all the testers: frontend/, backend_tester_x86/ and backend_tester_arm/.
+
+
+def format_seconds(seconds:float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours}:{minutes:02}:{seconds:02}' if hours else f'{minutes}:{seconds:02}'
+
+
+class Progress:
+    """Progress shows a run on the terminal as it goes.
+
+    If the terminal is a TTY, a view of the run is kept at the bottom of it and
+    redrawn a few times a second: the number of testcases finished, the throughput
+    (cases/s) and the ETA, the counts of the statuses so far, and the testcases in
+    flight with the stage each is in and how long it has been running. The lines of
+    the testcases finished are printed above the view as they come.
+
+    Otherwise (e.g. redirected to a file), only the lines of the testcases finished
+    are printed as they come, so that the log stays plain.
+
+    All the methods can be called from different threads at the same time.
+
+    Attributes:
+        total: Number of testcases to test, or None if not known up front (e.g.
+                testcases tested as they are found).
+        abbrs: A list of (abbreviation, status) pairs of the statuses to count, e.g.
+                ('AC', ACCEPTED).
+        width: Width of the paths of the testcases in the view.
+        stream: A text stream to show the progress on.
+        live: Bool indicating if the view is shown, True by default if the stream is
+                a TTY.
+        counts: A Counter of the statuses of the testcases finished.
+    """
+
+    def __init__(self,
+        total:Optional[int]=None, abbrs:List[Tuple[str, str]]=(), width:int=45,
+        stream:Optional[TextIO]=None, live:Optional[bool]=None, interval:float=0.5
+    ) -> None:
+        """Initialize a Progress, and start redrawing the view if shown.
+
+        Args:
+            interval: Seconds between redrawing the view.
+        """
+        self.total = total
+        self.abbrs = list(abbrs)
+        self.width = width
+        self.stream = stream if stream is not None else sys.stdout
+        self.live = live if live is not None else self.stream.isatty()
+        self.counts = Counter()
+        self.n_done = 0
+        # TestCase -> [the stage, the time it started].
+        self.in_flight: Dict[TestCase, list] = {}
+        self.start_time = time.perf_counter()
+        # Lines of the view on the terminal, to be erased before redrawing.
+        self.n_drawn = 0
+        self.lock = threading.Lock()
+        self.closed = threading.Event()
+        self.drawer = None
+        if self.live:
+            self.drawer = threading.Thread(target=self.keep_drawing, args=(interval,), daemon=True)
+            self.drawer.start()
+
+    def __enter__(self) -> 'Progress':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def start(self, testcase:TestCase) -> None:
+        """Mark a testcase as in flight.
+        """
+        with self.lock:
+            self.in_flight[testcase] = ['', time.perf_counter()]
+
+    def stage(self, testcase:TestCase, name:str) -> None:
+        """Mark a testcase in flight as entering a stage, e.g. as Pipeline.on_stage.
+        """
+        with self.lock:
+            if testcase in self.in_flight:
+                self.in_flight[testcase][0] = name
+
+    def finish(self, testcase:TestCase, status:str, line:str='') -> None:
+        """Mark a testcase as finished with a status, and print its line (if any).
+        """
+        with self.lock:
+            self.in_flight.pop(testcase, None)
+            self.counts[status] += 1
+            self.n_done += 1
+            self.write(line)
+
+    def log(self, line:str) -> None:
+        """Print a line (ending with a newline) without breaking the view.
+        """
+        with self.lock:
+            self.write(line)
+
+    def close(self) -> None:
+        """Stop redrawing, and leave the view of the end of the run on the terminal,
+        under which anything is printed later.
+        """
+        self.closed.set()
+        if self.drawer is not None:
+            self.drawer.join()
+            self.drawer = None
+            with self.lock:
+                self.write('')
+                self.live = False
+
+    def keep_drawing(self, interval:float) -> None:
+        while not self.closed.wait(interval):
+            with self.lock:
+                self.write('')
+
+    def write(self, line:str) -> None:
+        """Print a line above the view, and redraw the view. Called with the lock held.
+        """
+        if not self.live:
+            if line:
+                self.stream.write(line)
+                self.stream.flush()
+            return
+        # Back to the top of the view, and erase it.
+        erase = f'\x1b[{self.n_drawn}F\x1b[J' if self.n_drawn else ''
+        view = self.render()
+        self.n_drawn = len(view)
+        self.stream.write(erase + line + ''.join(row + '\n' for row in view))
+        self.stream.flush()
+
+    def render(self) -> List[str]:
+        """Render the rows of the view, cut to fit the terminal.
+        """
+        now = time.perf_counter()
+        columns, rows = shutil.get_terminal_size()
+        elapsed = now - self.start_time
+        rate = self.n_done / elapsed if elapsed > 0 else 0.0
+        head = f'[{self.n_done}/{self.total}]' if self.total is not None \
+            else f'[{self.n_done}]'
+        head += f' {format_seconds(elapsed)}, {rate:.2f} cases/s'
+        if self.total is not None and rate > 0:
+            head += f', ETA {format_seconds((self.total - self.n_done) / rate)}'
+        if self.abbrs:
+            head += ' | ' + ', '.join(
+                f'{abbr}: {self.counts[status]}' for abbr, status in self.abbrs
+            )
+        view = [head]
+        # The longest running first, leaving a row for the head and one for the cursor.
+        running = sorted(self.in_flight.items(), key=lambda item: item[1][1])
+        shown = running[:max(rows - 3, 1)]
+        for testcase, (stage, start) in shown:
+            view.append(
+                f'  {str(testcase.src_path).ljust(self.width)} {stage:<8}'
+                f' {now - start:7.1f}s'
+            )
+        if len(running) > len(shown):
+            view.append(f'  ... and {len(running) - len(shown)} more in flight')
+        return [row[:columns - 1] for row in view]
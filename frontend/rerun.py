@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+from caseloader import TestCase
+from pipeline import ACCEPTED
+
+
+# Machine-readable results of a run, written next to result.log.
+RESULTS_FILE = 'results.json'
+
+# Modes of rerunning only part of the testcases.
+RERUN_FAILED = 'failed'
+RERUN_CHANGED = 'changed'
+
+
+def file_digest(path:Optional[str]) -> str:
+    """Get the SHA-256 hex digest of the content of a file, or '' if there's no file.
+    """
+    if path is None or not os.path.exists(path):
+        return ''
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def case_digest(testcase:TestCase) -> str:
+    """Get the digest of all the inputs of a testcase (source, input and standard output).
+    """
+    h = hashlib.sha256()
+    for path in (testcase.src_path, testcase.in_path, testcase.std_out_path):
+        h.update(file_digest(path).encode())
+    return h.hexdigest()
+
+
+def find_last_results(gen_dir:str, exclude:Optional[str]=None) -> Optional[Path]:
+    """Find the results of the latest run under a directory.
+
+    Args:
+        gen_dir: A string of path to the directory where runs are created.
+        exclude: [Optional] A string of path to the directory of a run to skip,
+                e.g. the current one.
+
+    Returns:
+        A Path to the results file, or None if there is no run with results.
+    """
+    candidates = [
+        d/RESULTS_FILE for d in Path(gen_dir).glob('testgen-*')
+        if (d/RESULTS_FILE).exists() and (exclude is None or d != Path(exclude))
+    ]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda p: p.stat().st_mtime)
+
+
+def load_results(path:str) -> Dict[str, Dict]:
+    """Load the results of a run.
+
+    Args:
+        path: A string of path to the results file, or to the directory of the run.
+
+    Returns:
+        A dict mapping paths to the testcase sources to their records.
+    """
+    path = Path(path)
+    if path.is_dir():
+        path = path/RESULTS_FILE
+    with open(path) as f:
+        return json.load(f)['cases']
+
+
+def write_results(dest_dir:str, records:Dict[str, Dict]) -> None:
+    """Write the records of testcases as the results file under the given directory.
+    """
+    with open(Path(dest_dir)/RESULTS_FILE, 'w') as f:
+        json.dump({'cases': records}, f, indent=1)
+
+
+def needs_rerun(record:Optional[Dict], mode:str, digests:Dict[str, str]) -> bool:
+    """Check if a testcase is to be tested again.
+
+    Args:
+        record: The record of the testcase in the previous run, or None if not tested.
+        mode: RERUN_FAILED to test again the testcases failed (compiler changes are
+                ignored, as the compiler is expected to be fixed in between), or
+                RERUN_CHANGED to test again the testcases of which anything tested
+                with has changed, including the compiler and the runtime.
+        digests: A dict of the current digests of the 'case' (see case_digest),
+                the 'compiler' and the 'runtime'.
+    """
+    if record is None or record['digest'] != digests['case']:
+        return True
+    if mode == RERUN_FAILED:
+        return record['status'] != ACCEPTED
+    if mode == RERUN_CHANGED:
+        return record['compiler'] != digests['compiler'] \
+            or record['runtime'] != digests['runtime']
+    raise ValueError(f'unknown rerun mode: {mode}')
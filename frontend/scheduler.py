@@ -0,0 +1,66 @@
+import json
+import os
+from pathlib import Path
+from typing import List
+
+from caseloader import TestCase
+from pipeline import ACCEPTED
+
+
+class History:
+    """History of the durations and outcomes of testcases across runs, persisted
+    as a JSON file, for scheduling testcases in later runs.
+
+    Durations are smoothed over runs (with an exponential moving average), so that
+    a single noisy run doesn't reorder the testcases much.
+
+    Attributes:
+        path: A Path to the history file.
+        records: A dict mapping paths to the testcase sources to dicts of their
+                'seconds' and last 'status'.
+        smoothing: The weight of the latest duration in the average.
+    """
+
+    def __init__(self, path:str, smoothing:float=0.5) -> None:
+        """Initialize a History, loading the history file if existing.
+        """
+        self.path = Path(path)
+        self.smoothing = smoothing
+        self.records = {}
+        if self.path.exists():
+            with open(self.path) as f:
+                self.records = json.load(f)
+
+    @staticmethod
+    def key(testcase:TestCase) -> str:
+        return str(testcase.src_path)
+
+    def update(self, testcase:TestCase, seconds:float, status:str) -> None:
+        """Record the duration and outcome of a testcase in this run.
+        """
+        record = self.records.get(self.key(testcase))
+        if record is not None:
+            seconds = self.smoothing * seconds + (1 - self.smoothing) * record['seconds']
+        self.records[self.key(testcase)] = {'seconds': round(seconds, 6), 'status': status}
+
+    def save(self) -> None:
+        os.makedirs(self.path.parent, exist_ok=True)
+        with open(self.path, 'w') as f:
+            json.dump(self.records, f, indent=1)
+
+    def schedule(self, testcases:List[TestCase]) -> List[TestCase]:
+        """Order testcases to run: those failed last time first, then the rest, each
+        longest-processing-time first.
+
+        Handed out to workers in this order, the long testcases start early rather
+        than dominate the tail, and known failures show up first. Testcases never run
+        before go between the two, as nothing is known about them.
+        """
+        def priority(testcase:TestCase):
+            record = self.records.get(self.key(testcase))
+            if record is None:
+                return (1, 0.0)
+            failed = record['status'] != ACCEPTED
+            return (0 if failed else 2, -record['seconds'])
+        # Stable, so that ties keep the order of the testcases.
+        return sorted(testcases, key=priority)